@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-18
+Purpose: Evaluate every saved search against the studies changed by the
+         latest data load, for email alerts
+"""
+
+import argparse
+import datetime as dt
+import os
+import sys
+from ct import database, fn, Dataload, SavedSearch, WebUser
+from search import LINKS, MATCH_ALL, Query, to_ids, to_query, tsquery_terms
+from serialize import dumps
+from typing import Dict, List, NamedTuple, Optional, Set, TextIO, Tuple
+
+# (search field, tsquery term) -> IDs of the changed studies it matches
+Matches = Dict[Tuple[str, str], Set[int]]
+
+
+class Args(NamedTuple):
+    """ Command-line arguments """
+    since: Optional[dt.datetime]
+    mark: Optional[str]
+    outfile: TextIO
+
+
+class Changed(NamedTuple):
+    """ A study changed by the load, with what searches filter on """
+    nct_id: str
+    brief_title: str
+    phase_id: int
+    study_type_id: int
+    enrollment: Optional[int]
+
+
+# --------------------------------------------------
+def get_args() -> Args:
+    """ Get command-line arguments """
+
+    parser = argparse.ArgumentParser(
+        description='Evaluate saved searches for alerts',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-s',
+                        '--since',
+                        help='Studies changed at/after this date or time '
+                        '(default: where the --mark left off, else the '
+                        'start of the latest data load)',
+                        metavar='DATE',
+                        type=dt.datetime.fromisoformat)
+
+    parser.add_argument('-m',
+                        '--mark',
+                        help='File to keep where each run left off, '
+                        'so the next starts from there',
+                        metavar='FILE')
+
+    parser.add_argument('-o',
+                        '--outfile',
+                        help='Output file, one JSON line per user',
+                        metavar='FILE',
+                        type=argparse.FileType('wt'),
+                        default=sys.stdout)
+
+    args = parser.parse_args()
+
+    return Args(args.since, args.mark, args.outfile)
+
+
+# --------------------------------------------------
+def main() -> None:
+    """ Make a jazz noise here """
+
+    args = get_args()
+
+    since = args.since or read_mark(args.mark) or latest_dataload()
+    if since is None:
+        sys.exit('No data loads recorded, use --since')
+
+    until = settled()
+    changed = changed_studies(since, until)
+    searches = list(SavedSearch.select(SavedSearch, WebUser).join(WebUser))
+    queries = {search.saved_search_id: to_query(search) for search in searches}
+
+    # Each distinct term is matched once for all the searches using it
+    terms: Dict[str, Set[str]] = {}
+    for query in queries.values():
+        for fld, fld_terms in search_terms(query).items():
+            terms.setdefault(fld, set()).update(fld_terms)
+
+    matches: Matches = {}
+    for fld, fld_terms in terms.items():
+        matches.update(match_terms(fld, sorted(fld_terms)))
+
+    alerts: Dict[int, dict] = {}
+    for search in searches:
+        if not (hits := evaluate(queries[search.saved_search_id], matches,
+                                 changed)):
+            continue
+
+        user = alerts.setdefault(
+            search.web_user.web_user_id, {
+                'web_user_id': search.web_user.web_user_id,
+                'email': search.web_user.email,
+                'searches': []
+            })
+        user['searches'].append({
+            'saved_search_id': search.saved_search_id,
+            'search_name': search.search_name,
+            'email_to': search.email_to or search.web_user.email,
+            'studies': [{
+                'nct_id': changed[study_id].nct_id,
+                'brief_title': changed[study_id].brief_title
+            } for study_id in hits]
+        })
+
+    for user in alerts.values():
+        args.outfile.write(dumps(user).decode() + '\n')
+
+    if args.mark:
+        with open(args.mark, 'wt') as fh:
+            print(until.isoformat(), file=fh)
+
+    print(
+        f'{len(changed):,} studies changed since {since}, '
+        f'{len(searches):,} searches, {len(matches):,} distinct terms, '
+        f'{len(alerts):,} users to alert',
+        file=sys.stderr)
+
+
+# --------------------------------------------------
+def read_mark(filename: Optional[str]) -> Optional[dt.datetime]:
+    """ Where the last run left off, if it was kept """
+
+    if filename and os.path.isfile(filename):
+        with open(filename, 'rt') as fh:
+            if text := fh.read().strip():
+                return dt.datetime.fromisoformat(text)
+
+    return None
+
+
+# --------------------------------------------------
+def settled() -> dt.datetime:
+    """
+    Before when every study has been committed: now, or the start of the
+    oldest transaction still open, e.g., a load's batch, whose studies
+    are stamped with when it started
+    """
+
+    sql = ('SELECT LEAST(LOCALTIMESTAMP, MIN(xact_start)::timestamp) '
+           'FROM pg_stat_activity WHERE datname = current_database() '
+           "AND backend_type = 'client backend' "
+           'AND pid <> pg_backend_pid()')
+
+    return database.execute_sql(sql).fetchone()[0]
+
+
+# --------------------------------------------------
+def latest_dataload() -> Optional[dt.datetime]:
+    """
+    When the last recorded data load started, or the day it was recorded
+    for loads from before start times were kept
+    """
+
+    return Dataload.select(
+        fn.MAX(fn.COALESCE(Dataload.started_at,
+                           Dataload.updated_on))).scalar()
+
+
+# --------------------------------------------------
+def changed_studies(since: dt.datetime,
+                    until: dt.datetime) -> Dict[int, Changed]:
+    """
+    Studies (re)loaded at or after the one time and before the other,
+    also kept in the session's tmp_changed table to match terms against
+    """
+
+    cursor = database.cursor()
+    cursor.execute('DROP TABLE IF EXISTS tmp_changed')
+    cursor.execute(
+        'CREATE TEMP TABLE tmp_changed AS '
+        'SELECT study_id, nct_id, brief_title, phase_id, study_type_id, '
+        'enrollment FROM study '
+        'WHERE record_last_updated >= %s AND record_last_updated < %s',
+        [since, until])
+    cursor.execute('ALTER TABLE tmp_changed ADD PRIMARY KEY (study_id)')
+    cursor.execute('ANALYZE tmp_changed')
+    cursor.execute('SELECT * FROM tmp_changed')
+
+    return {row[0]: Changed(*row[1:]) for row in cursor.fetchall()}
+
+
+# --------------------------------------------------
+def search_terms(query: Query) -> Dict[str, List[str]]:
+    """ The tsquery terms of each field the search uses """
+
+    return {
+        fld: terms
+        for fld in ['full_text'] + list(LINKS)
+        if (terms := tsquery_terms(getattr(query, fld)))
+    }
+
+
+# --------------------------------------------------
+def match_terms(fld: str, terms: List[str]) -> Matches:
+    """ Changed studies matching each of a field's terms, in one query """
+
+    if fld == 'full_text':
+        sql = """
+        WITH q AS MATERIALIZED (
+             SELECT term, to_tsquery('english', term) AS tsq
+             FROM   unnest(%s::text[]) AS term)
+        SELECT q.term, c.study_id
+        FROM   tmp_changed c
+        JOIN   study s ON s.study_id = c.study_id
+        JOIN   q ON s.fulltext @@ q.tsq
+        """
+    else:
+        # Names are matched through their GIN indexes, then linked to
+        # the changed studies
+        link, table, key, name = LINKS[fld]
+        sql = f"""
+        SELECT DISTINCT q.term, x.study_id
+        FROM   unnest(%s::text[]) AS q(term)
+        JOIN   {table} n
+               ON to_tsvector('english', n.{name}) @@
+                  to_tsquery('english', q.term)
+        JOIN   {link} x ON x.{key} = n.{key}
+        JOIN   tmp_changed c ON c.study_id = x.study_id
+        """
+
+    matches: Matches = {(fld, term): set() for term in terms}
+    cursor = database.cursor()
+    cursor.execute(sql, [terms])
+    for term, study_id in cursor.fetchall():
+        matches[(fld, term)].add(study_id)
+
+    return matches
+
+
+# --------------------------------------------------
+def evaluate(query: Query, matches: Matches,
+             changed: Dict[int, Changed]) -> List[int]:
+    """
+    The changed studies a search matches, ordered by NCT ID, with the
+    same semantics as search.compile_query()
+    """
+
+    phase_ids = set(to_ids(query.phase_ids))
+    study_type_ids = set(to_ids(query.study_type_ids))
+    terms = search_terms(query)
+
+    # A search with nothing to match on would alert on everything
+    if not (terms or phase_ids or study_type_ids or query.enrollment):
+        return []
+
+    hits = set(changed)
+    for fld, fld_terms in terms.items():
+        found = [matches[(fld, term)] for term in fld_terms]
+        if getattr(query, fld + '_bool') == MATCH_ALL:
+            hits &= set.intersection(*found)
+        else:
+            hits &= set.union(*found)
+
+    return sorted(
+        (study_id for study_id in hits
+         if (not phase_ids or changed[study_id].phase_id in phase_ids) and (
+             not study_type_ids
+             or changed[study_id].study_type_id in study_type_ids) and (
+                 not query.enrollment or
+                 (changed[study_id].enrollment or 0) >= query.enrollment)),
+        key=lambda study_id: changed[study_id].nct_id)
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
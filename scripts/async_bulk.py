@@ -0,0 +1,146 @@
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-18
+Purpose: Bulk load studies with asyncpg, several batches in flight
+"""
+
+import asyncio
+import re
+from bulk import MERGE, STAGING, staged_rows
+from ct import database
+from itertools import islice
+from metrics import Metrics
+from records import StudyRecord
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, \
+    Tuple
+
+# A (name, study) to load or, if the study is None, just to record
+Item = Tuple[str, Optional[StudyRecord]]
+
+
+# --------------------------------------------------
+def asyncpg_module() -> Any:
+    """ Import the optional asyncpg module """
+
+    try:
+        import asyncpg
+    except ImportError:
+        raise ImportError('Install "asyncpg" to load with --async')
+
+    return asyncpg
+
+
+# --------------------------------------------------
+async def load_all(items: Iterable[Item],
+                   record: Callable[[List[str]], None],
+                   batch_size: int = 1000,
+                   in_flight: int = 4,
+                   fulltext_load: bool = True,
+                   metrics: Optional[Metrics] = None) -> None:
+    """
+    Load studies a batch at a time, each on a connection of its own,
+    with up to in_flight batches being written while the next is read
+    and decoded in a thread. Names are recorded once their batch commits.
+    DB stage times overlap, so they add up to more than the wall time.
+    """
+
+    asyncpg = asyncpg_module()
+    metrics = metrics or Metrics()
+    loop = asyncio.get_running_loop()
+
+    # asyncpg takes libpq's "-c name=value" options as server settings
+    params = dict(database.connect_params)
+    settings = dict(
+        re.findall(r'-c\s*(\w+)=(\S+)', params.pop('options', '')))
+    pool = await asyncpg.create_pool(database=database.database,
+                                     min_size=in_flight,
+                                     max_size=in_flight,
+                                     init=create_staging,
+                                     server_settings=settings,
+                                     **params)
+    slots = asyncio.Semaphore(in_flight)
+    tasks: Set[asyncio.Task] = set()
+
+    async def write(batch: Dict[str, StudyRecord], names: List[str]) -> None:
+        try:
+            async with pool.acquire() as conn:
+                await load_batch(conn, list(batch.values()), fulltext_load,
+                                 metrics)
+        finally:
+            slots.release()
+        record(names)
+        metrics.done(len(names))
+
+    try:
+        items = iter(items)
+        while True:
+            chunk = await loop.run_in_executor(
+                None, lambda: list(islice(items, batch_size)))
+            if not chunk:
+                break
+
+            batch: Dict[str, StudyRecord] = {}
+            names: List[str] = []
+            skipped: List[str] = []
+            for name, study in chunk:
+                if study is None:
+                    skipped.append(name)
+                else:
+                    # The same NCT ID twice in one batch can't be upserted
+                    batch[study.nct_id] = study
+                    names.append(name)
+
+            record(skipped)
+            metrics.done(len(skipped))
+            if not batch:
+                continue
+
+            await slots.acquire()
+
+            # Stop at the first failed batch rather than load the rest
+            for task in [task for task in tasks if task.done()]:
+                tasks.discard(task)
+                task.result()
+
+            tasks.add(asyncio.create_task(write(batch, names)))
+
+        await asyncio.gather(*tasks)
+    finally:
+        await pool.close()
+
+
+# --------------------------------------------------
+async def create_staging(conn: Any) -> None:
+    """ Create a new connection's staging tables """
+
+    for table, columns in STAGING:
+        cols = ', '.join(f'{name} {typ}' for name, typ in columns)
+        await conn.execute(f'CREATE TEMP TABLE IF NOT EXISTS {table} '
+                           f'({cols}) ON COMMIT DELETE ROWS')
+
+
+# --------------------------------------------------
+async def load_batch(conn: Any, studies: List[StudyRecord],
+                     fulltext_load: bool, metrics: Metrics) -> None:
+    """
+    Stage a batch with binary COPY, the rows keeping their Python types,
+    then merge it with all the statements in one round trip
+    """
+
+    with metrics.stage('stage rows'):
+        staged = staged_rows(studies)
+
+    # The merge's one parameter, inlined to send it as a simple query
+    merge = ';\n'.join(MERGE).replace('%(fulltext_load)s',
+                                      'TRUE' if fulltext_load else 'FALSE')
+
+    async with conn.transaction():
+        for (table, rows), (_, columns) in zip(staged, STAGING):
+            with metrics.stage(f'copy {table}'):
+                await conn.copy_records_to_table(
+                    table,
+                    records=rows,
+                    columns=[name for name, _ in columns])
+
+        with metrics.stage('db merge'):
+            await conn.execute(merge)
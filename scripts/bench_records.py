@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-18
+Purpose: Compare the memory of a batch of study dicts vs StudyRecords
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+from itertools import chain, cycle, islice
+from records import to_record
+from serialize import dumps, loads
+from shards import SHARD_SUFFIXES, read_studies
+from sources import Source, find_sources
+from typing import Any, Callable, List, NamedTuple, Tuple
+
+
+class Args(NamedTuple):
+    """ Command-line arguments """
+    files: List[Source]
+    number: int
+
+
+# --------------------------------------------------
+def get_args() -> Args:
+    """ Get command-line arguments """
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark the memory of a batch of studies',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('file',
+                        help='Input JSON/JSONL file(s), directories or zip '
+                        'archives',
+                        metavar='FILE',
+                        type=str,
+                        nargs='+')
+
+    parser.add_argument('-n',
+                        '--number',
+                        help='Studies in the batch, reusing inputs if needed',
+                        metavar='INT',
+                        type=int,
+                        default=10000)
+
+    args = parser.parse_args()
+
+    files = find_sources(args.file, ('.json', ) + SHARD_SUFFIXES)
+    if not files:
+        parser.error('No JSON files found')
+
+    return Args(files, args.number)
+
+
+# --------------------------------------------------
+def main() -> None:
+    """ Make a jazz noise here """
+
+    args = get_args()
+
+    # Keep the encoded studies so each decode makes new objects
+    studies = chain.from_iterable(map(read_studies, args.files))
+    encoded = list(islice(cycle(dumps(data) for _, data in studies),
+                          args.number))
+
+    # Warm the date cache so it isn't counted against the records
+    list(map(to_record, map(loads, set(encoded))))
+
+    print(f'{len(encoded):,} studies')
+    dict_size, dict_secs = measure(lambda: list(map(loads, encoded)))
+    rec_size, rec_secs = measure(
+        lambda: [to_record(loads(raw)) for raw in encoded])
+
+    for name, size, secs in [('dict', dict_size, dict_secs),
+                             ('StudyRecord', rec_size, rec_secs)]:
+        print(f'{name:12} {size / 2**20:10.1f} MiB '
+              f'{size / len(encoded):10,.0f} bytes/study {secs:8.3f}s')
+
+    print(f'Reduction    {dict_size / rec_size:10.2f}x '
+          '(times include tracemalloc overhead)')
+
+
+# --------------------------------------------------
+def measure(build: Callable[[], Any]) -> Tuple[int, float]:
+    """ Bytes still allocated by what build() returns, and its time """
+
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    batch = build()
+    secs = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del batch
+
+    return size, secs
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-18
+Purpose: Benchmark study JSON encoding against typedload.dump + json.dumps
+"""
+
+import argparse
+import json
+import sys
+import timeit
+import typedload
+import serialize
+import xml2json
+from sources import Source, find_sources
+from typing import Any, List, NamedTuple, TextIO
+
+
+class Args(NamedTuple):
+    """ Command-line arguments """
+    files: List[Source]
+    schema: TextIO
+    number: int
+
+
+# --------------------------------------------------
+def get_args() -> Args:
+    """ Get command-line arguments """
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark study serialization',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('file',
+                        help='Input XML file(s), directories or zip archives',
+                        metavar='FILE',
+                        type=str,
+                        nargs='+')
+
+    parser.add_argument('-s',
+                        '--schema',
+                        help='XML Schema',
+                        metavar='FILE',
+                        type=argparse.FileType('rt'),
+                        required=True)
+
+    parser.add_argument('-n',
+                        '--number',
+                        help='Times to encode each study',
+                        metavar='INT',
+                        type=int,
+                        default=10)
+
+    args = parser.parse_args()
+
+    files = find_sources(args.file, '.xml')
+    if not files:
+        parser.error('No XML files found')
+
+    return Args(files, args.schema, args.number)
+
+
+# --------------------------------------------------
+def main() -> None:
+    """ Make a jazz noise here """
+
+    args = get_args()
+    xml2json.init_worker(args.schema.name, None)
+
+    studies = []
+    for file in args.files:
+        with file.open() as fh:
+            study, _ = xml2json.read_study(file, fh.read())
+        if study:
+            studies.append(study)
+
+    if not studies:
+        sys.exit('No valid studies')
+
+    mismatched = [
+        study['nct_id'] for study in studies
+        if json.loads(old_encode(study)) != serialize.loads(new_encode(study))
+        or new_encode(study) != fallback_encode(study)
+    ]
+    if mismatched:
+        sys.exit('\n'.join(['Output differs for:'] + mismatched))
+
+    encoder = 'orjson' if serialize.orjson else 'json'
+    num = len(studies) * args.number
+    print(f'{len(studies):,} studies x {args.number:,}, output equivalent, '
+          f'encoder "{encoder}"')
+
+    for name, encode in [('typedload + json.dumps', old_encode),
+                         ('dumps(indent=True)', new_encode),
+                         ('dumps()', serialize.dumps)]:
+        secs = timeit.timeit(lambda: list(map(encode, studies)),
+                             number=args.number)
+        print(f'{name:25} {secs:8.3f}s {1e6 * secs / num:10.1f} us/study')
+
+
+# --------------------------------------------------
+def old_encode(study: Any) -> str:
+    """ JSON the way xml2json used to write it """
+
+    return json.dumps(typedload.dump(study), indent=4)
+
+
+# --------------------------------------------------
+def new_encode(study: Any) -> bytes:
+    """ JSON as xml2json writes it now """
+
+    return serialize.dumps(study, indent=True)
+
+
+# --------------------------------------------------
+def fallback_encode(study: Any) -> bytes:
+    """ What serialize.dumps() gives without orjson """
+
+    return json.dumps(study, indent=2, ensure_ascii=False).encode()
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-18
+Purpose: Benchmark tokenizer.tokenize() against the old per-tuple words()
+"""
+
+import argparse
+import os
+import re
+import sys
+import timeit
+from itertools import chain
+from pathlib import Path
+from xml.etree.ElementTree import ElementTree
+from tokenizer import tokenize
+from xml2json import flatten
+from typing import Any, List, NamedTuple, Tuple
+
+
+class Args(NamedTuple):
+    """ Command-line arguments """
+    files: List[str]
+    number: int
+
+
+# --------------------------------------------------
+def get_args() -> Args:
+    """ Get command-line arguments """
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark the search text tokenizer',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('file',
+                        help='Input XML file(s) or directories',
+                        metavar='FILE',
+                        type=str,
+                        nargs='+')
+
+    parser.add_argument('-n',
+                        '--number',
+                        help='Times to tokenize each document',
+                        metavar='INT',
+                        type=int,
+                        default=10)
+
+    args = parser.parse_args()
+
+    files = []
+    for name in args.file:
+        if os.path.isdir(name):
+            files.extend(map(str, Path(name).rglob('*.xml')))
+        else:
+            files.append(name)
+
+    if not files:
+        parser.error('No XML files found')
+
+    return Args(files, args.number)
+
+
+# --------------------------------------------------
+def main() -> None:
+    """ Make a jazz noise here """
+
+    args = get_args()
+    docs = [list(flatten(ElementTree().parse(file))) for file in args.files]
+
+    mismatched = [
+        file for file, pairs in zip(args.files, docs)
+        if old_tokens(pairs) != new_tokens(pairs)
+    ]
+    if mismatched:
+        sys.exit('\n'.join(['Output differs for:'] + mismatched))
+
+    old = timeit.timeit(lambda: list(map(old_tokens, docs)),
+                        number=args.number)
+    new = timeit.timeit(lambda: list(map(new_tokens, docs)),
+                        number=args.number)
+    num_docs = len(docs) * args.number
+
+    print(f'{len(docs):,} documents x {args.number:,}, output identical')
+    print(f'words()    {old:8.3f}s {1e3 * old / num_docs:8.3f} ms/doc')
+    print(f'tokenize() {new:8.3f}s {1e3 * new / num_docs:8.3f} ms/doc')
+    print(f'Speedup    {old / new:8.2f}x')
+
+
+# --------------------------------------------------
+def old_tokens(pairs: List[Tuple[str, str]]) -> List[str]:
+    """ Tokens the way xml2json used to make them """
+
+    return list(chain.from_iterable(map(words, pairs)))
+
+
+# --------------------------------------------------
+def new_tokens(pairs: List[Tuple[str, str]]) -> List[str]:
+    """ Tokens from tokenize() """
+
+    return tokenize(text for _, text in pairs)
+
+
+# --------------------------------------------------
+def words(t: Tuple[Any, str]) -> List[str]:
+    """ Return the words from the tuple value (the original xml2json code) """
+    def clean(s):
+        s = re.sub(r'[\s_-]+', ' ', s)
+        return re.sub(r'[^a-zA-Z0-9.\s]', '', s)
+
+    def stop(word):
+        # digit
+        if re.match(r'^[-]?[\d.]+$', word):
+            return False
+
+        if len(word) <= 1:
+            return False
+
+        if word in ('an', 'the', 'and'):
+            return False
+
+        return True
+
+    return list(filter(stop, map(clean, t[1].lower().split())))
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
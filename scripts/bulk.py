@@ -0,0 +1,511 @@
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-18
+Purpose: Bulk load studies into Postgres with COPY and set-based merges
+"""
+
+import io
+import re
+from ct import database
+from metrics import Metrics
+from records import StudyRecord
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Staging tables: (name, [(column, type)]), emptied by every commit
+STAGING = [
+    ('tmp_study', [
+        ('nct_id', 'text'),
+        ('phase_name', 'text'),
+        ('study_type_name', 'text'),
+        ('overall_status_name', 'text'),
+        ('last_known_status_name', 'text'),
+        ('brief_title', 'text'),
+        ('official_title', 'text'),
+        ('org_study_id', 'text'),
+        ('acronym', 'text'),
+        ('source', 'text'),
+        ('rank', 'text'),
+        ('brief_summary', 'text'),
+        ('detailed_description', 'text'),
+        ('why_stopped', 'text'),
+        ('has_expanded_access', 'text'),
+        ('target_duration', 'text'),
+        ('biospec_retention', 'text'),
+        ('biospec_description', 'text'),
+        ('keywords', 'text'),
+        ('enrollment', 'integer'),
+        ('start_date', 'date'),
+        ('completion_date', 'date'),
+        ('study_first_posted', 'date'),
+        ('last_update_posted', 'date'),
+        ('fulltext_load', 'text'),
+    ]),
+    ('tmp_condition', [('nct_id', 'text'), ('condition_name', 'text')]),
+    ('tmp_sponsor', [('nct_id', 'text'), ('sponsor_name', 'text')]),
+    ('tmp_intervention', [('nct_id', 'text'),
+                          ('intervention_name', 'text')]),
+    ('tmp_doc', [('nct_id', 'text'), ('doc_id', 'text'), ('doc_type', 'text'),
+                 ('doc_url', 'text'), ('doc_comment', 'text')]),
+    ('tmp_outcome', [('nct_id', 'text'), ('outcome_type', 'text'),
+                     ('measure', 'text'), ('time_frame', 'text'),
+                     ('description', 'text')]),
+    ('tmp_arm_group', [('nct_id', 'text'), ('arm_group_label', 'text'),
+                       ('arm_group_type', 'text'), ('description', 'text')]),
+    ('tmp_design', [('nct_id', 'text'), ('allocation', 'text'),
+                    ('intervention_model', 'text'),
+                    ('intervention_model_description', 'text'),
+                    ('primary_purpose', 'text'),
+                    ('observational_model', 'text'),
+                    ('time_perspective', 'text'), ('masking', 'text'),
+                    ('masking_description', 'text')]),
+    ('tmp_eligibility', [('nct_id', 'text'), ('study_pop', 'text'),
+                         ('sampling_method', 'text'), ('criteria', 'text'),
+                         ('gender', 'text'), ('gender_based', 'text'),
+                         ('gender_description', 'text'),
+                         ('minimum_age', 'text'), ('maximum_age', 'text'),
+                         ('healthy_volunteers', 'text')]),
+    ('tmp_location', [('nct_id', 'text'), ('facility_name', 'text'),
+                      ('status', 'text'), ('contact_name', 'text'),
+                      ('investigator_name', 'text')]),
+    ('tmp_url', [('nct_id', 'text'), ('url', 'text')]),
+]
+
+# Children with no natural key to match rows on, e.g., the millions of
+# locations, are replaced whole: staging table -> child table
+REPLACED = {
+    'tmp_arm_group': 'study_arm_group',
+    'tmp_design': 'study_design',
+    'tmp_eligibility': 'study_eligibility',
+    'tmp_location': 'study_location',
+    'tmp_url': 'study_url',
+}
+
+# Replacing a batch's children: delete what's stored, insert what's staged
+REPLACE = [
+    """
+    DELETE FROM {table} x
+    USING  tmp_study t
+    JOIN   study s ON s.nct_id = t.nct_id
+    WHERE  x.study_id = s.study_id
+    """,
+    """
+    INSERT INTO {table} (study_id, {cols})
+    SELECT s.study_id, {t_cols}
+    FROM   {tmp} t
+    JOIN   study s ON s.nct_id = t.nct_id
+    """,
+]
+
+# Columns copied as-is from tmp_study into study
+STUDY_FIELDS = [
+    'brief_title', 'official_title', 'org_study_id', 'acronym', 'source',
+    'rank', 'brief_summary', 'detailed_description', 'why_stopped',
+    'has_expanded_access', 'target_duration', 'biospec_retention',
+    'biospec_description', 'keywords', 'enrollment', 'start_date',
+    'completion_date', 'study_first_posted', 'last_update_posted'
+]
+
+# Set-based merge of the staged batch, run in order
+MERGE = [
+    # Lookup values, sorted so concurrent loaders lock in the same order
+    """
+    INSERT INTO phase (phase_name)
+    SELECT DISTINCT phase_name FROM tmp_study ORDER BY 1
+    ON CONFLICT (phase_name) DO NOTHING
+    """,
+    """
+    INSERT INTO study_type (study_type_name)
+    SELECT DISTINCT study_type_name FROM tmp_study ORDER BY 1
+    ON CONFLICT (study_type_name) DO NOTHING
+    """,
+    """
+    INSERT INTO status (status_name)
+    SELECT overall_status_name FROM tmp_study
+    UNION
+    SELECT last_known_status_name FROM tmp_study
+    ORDER BY 1
+    ON CONFLICT (status_name) DO NOTHING
+    """,
+    """
+    INSERT INTO condition (condition_name)
+    SELECT DISTINCT condition_name FROM tmp_condition ORDER BY 1
+    ON CONFLICT (condition_name) DO NOTHING
+    """,
+    """
+    INSERT INTO sponsor (sponsor_name)
+    SELECT DISTINCT sponsor_name FROM tmp_sponsor ORDER BY 1
+    ON CONFLICT (sponsor_name) DO NOTHING
+    """,
+    """
+    INSERT INTO intervention (intervention_name)
+    SELECT DISTINCT intervention_name FROM tmp_intervention ORDER BY 1
+    ON CONFLICT (intervention_name) DO NOTHING
+    """,
+
+    # Studies, with the search vector made from the batch's text and the
+    # text itself kept unless BulkLoader(fulltext_load=False)
+    """
+    INSERT INTO study (nct_id, phase_id, study_type_id, overall_status_id,
+                       last_known_status_id, {fields}, fulltext_load,
+                       fulltext)
+    SELECT t.nct_id, p.phase_id, st.study_type_id, os.status_id,
+           ls.status_id, {t_fields},
+           CASE WHEN %(fulltext_load)s THEN t.fulltext_load END,
+           to_tsvector('english', t.fulltext_load)
+    FROM   tmp_study t
+    JOIN   phase p ON p.phase_name = t.phase_name
+    JOIN   study_type st ON st.study_type_name = t.study_type_name
+    JOIN   status os ON os.status_name = t.overall_status_name
+    JOIN   status ls ON ls.status_name = t.last_known_status_name
+    ON CONFLICT (nct_id) DO UPDATE
+    SET    phase_id = EXCLUDED.phase_id,
+           study_type_id = EXCLUDED.study_type_id,
+           overall_status_id = EXCLUDED.overall_status_id,
+           last_known_status_id = EXCLUDED.last_known_status_id,
+           {updates},
+           fulltext_load = EXCLUDED.fulltext_load,
+           fulltext = EXCLUDED.fulltext,
+           record_last_updated = CURRENT_TIMESTAMP
+    """.format(fields=', '.join(STUDY_FIELDS),
+               t_fields=', '.join(f't.{fld}' for fld in STUDY_FIELDS),
+               updates=',\n           '.join(f'{fld} = EXCLUDED.{fld}'
+                                             for fld in STUDY_FIELDS)),
+
+    # Links and children: delete the batch's stored rows that are no
+    # longer staged, or that repeat an earlier row, then add the missing
+    """
+    DELETE FROM study_to_condition x
+    USING  tmp_study t
+    JOIN   study s ON s.nct_id = t.nct_id
+    WHERE  x.study_id = s.study_id
+    AND   (NOT EXISTS (
+           SELECT 1 FROM tmp_condition c
+           JOIN   condition n ON n.condition_name = c.condition_name
+           WHERE  c.nct_id = t.nct_id
+           AND    n.condition_id = x.condition_id)
+    OR     EXISTS (
+           SELECT 1 FROM study_to_condition y
+           WHERE  y.study_id = x.study_id
+           AND    y.condition_id = x.condition_id
+           AND    y.study_to_condition_id < x.study_to_condition_id))
+    """,
+    """
+    INSERT INTO study_to_condition (study_id, condition_id)
+    SELECT DISTINCT s.study_id, c.condition_id
+    FROM   tmp_condition t
+    JOIN   study s ON s.nct_id = t.nct_id
+    JOIN   condition c ON c.condition_name = t.condition_name
+    WHERE  NOT EXISTS (
+           SELECT 1 FROM study_to_condition x
+           WHERE  x.study_id = s.study_id
+           AND    x.condition_id = c.condition_id)
+    """,
+    """
+    DELETE FROM study_to_sponsor x
+    USING  tmp_study t
+    JOIN   study s ON s.nct_id = t.nct_id
+    WHERE  x.study_id = s.study_id
+    AND   (NOT EXISTS (
+           SELECT 1 FROM tmp_sponsor p
+           JOIN   sponsor n ON n.sponsor_name = p.sponsor_name
+           WHERE  p.nct_id = t.nct_id
+           AND    n.sponsor_id = x.sponsor_id)
+    OR     EXISTS (
+           SELECT 1 FROM study_to_sponsor y
+           WHERE  y.study_id = x.study_id
+           AND    y.sponsor_id = x.sponsor_id
+           AND    y.study_to_sponsor_id < x.study_to_sponsor_id))
+    """,
+    """
+    INSERT INTO study_to_sponsor (study_id, sponsor_id)
+    SELECT DISTINCT s.study_id, p.sponsor_id
+    FROM   tmp_sponsor t
+    JOIN   study s ON s.nct_id = t.nct_id
+    JOIN   sponsor p ON p.sponsor_name = t.sponsor_name
+    WHERE  NOT EXISTS (
+           SELECT 1 FROM study_to_sponsor x
+           WHERE  x.study_id = s.study_id
+           AND    x.sponsor_id = p.sponsor_id)
+    """,
+    """
+    DELETE FROM study_to_intervention x
+    USING  tmp_study t
+    JOIN   study s ON s.nct_id = t.nct_id
+    WHERE  x.study_id = s.study_id
+    AND   (NOT EXISTS (
+           SELECT 1 FROM tmp_intervention i
+           JOIN   intervention n ON n.intervention_name = i.intervention_name
+           WHERE  i.nct_id = t.nct_id
+           AND    n.intervention_id = x.intervention_id)
+    OR     EXISTS (
+           SELECT 1 FROM study_to_intervention y
+           WHERE  y.study_id = x.study_id
+           AND    y.intervention_id = x.intervention_id
+           AND    y.study_to_intervention_id < x.study_to_intervention_id))
+    """,
+    """
+    INSERT INTO study_to_intervention (study_id, intervention_id)
+    SELECT DISTINCT s.study_id, i.intervention_id
+    FROM   tmp_intervention t
+    JOIN   study s ON s.nct_id = t.nct_id
+    JOIN   intervention i ON i.intervention_name = t.intervention_name
+    WHERE  NOT EXISTS (
+           SELECT 1 FROM study_to_intervention x
+           WHERE  x.study_id = s.study_id
+           AND    x.intervention_id = i.intervention_id)
+    """,
+    """
+    DELETE FROM study_doc x
+    USING  tmp_study t
+    JOIN   study s ON s.nct_id = t.nct_id
+    WHERE  x.study_id = s.study_id
+    AND   (NOT EXISTS (
+           SELECT 1 FROM tmp_doc d
+           WHERE  d.nct_id = t.nct_id
+           AND    d.doc_id IS NOT DISTINCT FROM x.doc_id
+           AND    d.doc_type IS NOT DISTINCT FROM x.doc_type
+           AND    d.doc_url IS NOT DISTINCT FROM x.doc_url
+           AND    d.doc_comment IS NOT DISTINCT FROM x.doc_comment)
+    OR     EXISTS (
+           SELECT 1 FROM study_doc y
+           WHERE  y.study_id = x.study_id
+           AND    y.doc_id IS NOT DISTINCT FROM x.doc_id
+           AND    y.doc_type IS NOT DISTINCT FROM x.doc_type
+           AND    y.doc_url IS NOT DISTINCT FROM x.doc_url
+           AND    y.doc_comment IS NOT DISTINCT FROM x.doc_comment
+           AND    y.study_doc_id < x.study_doc_id))
+    """,
+    """
+    INSERT INTO study_doc (study_id, doc_id, doc_type, doc_url, doc_comment)
+    SELECT DISTINCT s.study_id, t.doc_id, t.doc_type, t.doc_url,
+           t.doc_comment
+    FROM   tmp_doc t
+    JOIN   study s ON s.nct_id = t.nct_id
+    WHERE  NOT EXISTS (
+           SELECT 1 FROM study_doc x
+           WHERE  x.study_id = s.study_id
+           AND    x.doc_id IS NOT DISTINCT FROM t.doc_id
+           AND    x.doc_type IS NOT DISTINCT FROM t.doc_type
+           AND    x.doc_url IS NOT DISTINCT FROM t.doc_url
+           AND    x.doc_comment IS NOT DISTINCT FROM t.doc_comment)
+    """,
+    """
+    DELETE FROM study_outcome x
+    USING  tmp_study t
+    JOIN   study s ON s.nct_id = t.nct_id
+    WHERE  x.study_id = s.study_id
+    AND   (NOT EXISTS (
+           SELECT 1 FROM tmp_outcome o
+           WHERE  o.nct_id = t.nct_id
+           AND    o.outcome_type = x.outcome_type
+           AND    o.measure = x.measure
+           AND    o.time_frame IS NOT DISTINCT FROM x.time_frame
+           AND    o.description IS NOT DISTINCT FROM x.description)
+    OR     EXISTS (
+           SELECT 1 FROM study_outcome y
+           WHERE  y.study_id = x.study_id
+           AND    y.outcome_type = x.outcome_type
+           AND    y.measure = x.measure
+           AND    y.time_frame IS NOT DISTINCT FROM x.time_frame
+           AND    y.description IS NOT DISTINCT FROM x.description
+           AND    y.study_outcome_id < x.study_outcome_id))
+    """,
+    """
+    INSERT INTO study_outcome (study_id, outcome_type, measure, time_frame,
+                               description)
+    SELECT DISTINCT s.study_id, t.outcome_type, t.measure, t.time_frame,
+           t.description
+    FROM   tmp_outcome t
+    JOIN   study s ON s.nct_id = t.nct_id
+    WHERE  NOT EXISTS (
+           SELECT 1 FROM study_outcome x
+           WHERE  x.study_id = s.study_id
+           AND    x.outcome_type = t.outcome_type
+           AND    x.measure = t.measure
+           AND    x.time_frame IS NOT DISTINCT FROM t.time_frame
+           AND    x.description IS NOT DISTINCT FROM t.description)
+    """,
+] + [
+    sql.format(table=REPLACED[tmp],
+               tmp=tmp,
+               cols=', '.join(name for name, _ in columns[1:]),
+               t_cols=', '.join(f't.{name}' for name, _ in columns[1:]))
+    for tmp, columns in STAGING if tmp in REPLACED for sql in REPLACE
+]
+
+# The table each MERGE statement writes, to time them by
+MERGE_TABLES = [
+    re.search(r'(?:INSERT INTO|UPDATE|DELETE FROM)\s+(\w+)', sql).group(1)
+    for sql in MERGE
+]
+
+# Escapes for text-format COPY, see the PostgreSQL COPY docs
+COPY_ESCAPES = str.maketrans({
+    '\\': '\\\\',
+    '\t': '\\t',
+    '\n': '\\n',
+    '\r': '\\r'
+})
+
+
+# --------------------------------------------------
+class BulkLoader:
+    """ Accumulate studies and load them a batch at a time """
+    def __init__(self,
+                 batch_size: int = 1000,
+                 fulltext_load: bool = True,
+                 metrics: Optional[Metrics] = None) -> None:
+        self.batch_size = batch_size
+        self.fulltext_load = fulltext_load
+        self.metrics = metrics or Metrics()
+        self.studies: Dict[str, StudyRecord] = {}
+        self.names: List[str] = []
+
+    def add(self, study: StudyRecord, name: str) -> List[str]:
+        """
+        Queue a study, loading the batch once it's full.
+        Returns the names of the files that were loaded, if any.
+        """
+
+        # The same NCT ID twice in one batch can't be upserted; last wins
+        self.studies[study.nct_id] = study
+        self.names.append(name)
+
+        if len(self.studies) >= self.batch_size:
+            return self.flush()
+
+        return []
+
+    def flush(self) -> List[str]:
+        """ Load any queued studies, return the names of their files """
+
+        if not self.studies:
+            return []
+
+        studies = list(self.studies.values())
+        with self.metrics.stage('stage rows'):
+            staged = staged_rows(studies)
+
+        with database.atomic():
+            cursor = database.cursor()
+            create_staging(cursor)
+            for table, rows in staged:
+                with self.metrics.stage(f'copy {table}'):
+                    copy_rows(cursor, table, rows)
+
+            for table, sql in zip(MERGE_TABLES, MERGE):
+                with self.metrics.stage(f'db {table}'):
+                    cursor.execute(sql,
+                                   {'fulltext_load': self.fulltext_load})
+
+        names = self.names
+        self.studies, self.names = {}, []
+        return names
+
+
+# --------------------------------------------------
+def create_staging(cursor: Any) -> None:
+    """ Create the session's staging tables if needed """
+
+    for table, columns in STAGING:
+        cols = ', '.join(f'{name} {typ}' for name, typ in columns)
+        cursor.execute(f'CREATE TEMP TABLE IF NOT EXISTS {table} ({cols}) '
+                       'ON COMMIT DELETE ROWS')
+
+
+# --------------------------------------------------
+def staged_rows(
+        studies: List[StudyRecord]) -> List[Tuple[str, List[Tuple]]]:
+    """ Rows for each staging table, in STAGING order """
+
+    rows: Dict[str, List[Tuple]] = {table: [] for table, _ in STAGING}
+    for study in studies:
+        nct_id = study.nct_id
+        rows['tmp_study'].append(study_row(study))
+
+        for condition in study.conditions:
+            rows['tmp_condition'].append((nct_id, condition))
+
+        for sponsor in study.sponsors:
+            rows['tmp_sponsor'].append((nct_id, sponsor))
+
+        for intervention in study.interventions:
+            rows['tmp_intervention'].append((nct_id, intervention))
+
+        for doc in study.docs:
+            rows['tmp_doc'].append((nct_id, ) + doc)
+
+        for outcome in study.outcomes:
+            rows['tmp_outcome'].append((nct_id, ) + outcome)
+
+        for group in study.arm_groups:
+            rows['tmp_arm_group'].append((nct_id, ) + group)
+
+        if study.design:
+            rows['tmp_design'].append((nct_id, ) + study.design)
+
+        if study.eligibility:
+            rows['tmp_eligibility'].append((nct_id, ) + study.eligibility)
+
+        for location in study.locations:
+            rows['tmp_location'].append((nct_id, ) + location)
+
+        for url in study.urls:
+            rows['tmp_url'].append((nct_id, url))
+
+    return [(table, rows[table]) for table, _ in STAGING]
+
+
+# --------------------------------------------------
+def study_row(study: StudyRecord) -> Tuple:
+    """ The tmp_study row for a study """
+
+    return (
+        study.nct_id,
+        study.phase,
+        study.study_type,
+        study.overall_status,
+        study.last_known_status,
+        study.brief_title,
+        study.official_title,
+        study.org_study_id,
+        study.acronym,
+        study.source,
+        study.rank,
+        study.brief_summary,
+        study.detailed_description,
+        study.why_stopped,
+        study.has_expanded_access,
+        study.target_duration,
+        study.biospec_retention,
+        study.biospec_description,
+        study.keywords,
+        study.enrollment,
+        study.start_date,
+        study.completion_date,
+        study.study_first_posted,
+        study.last_update_posted,
+        study.text,
+    )
+
+
+# --------------------------------------------------
+def copy_rows(cursor: Any, table: str, rows: Iterable[Tuple]) -> None:
+    """ COPY rows into a staging table """
+
+    buf = io.StringIO()
+    for row in rows:
+        buf.write('\t'.join(map(copy_value, row)) + '\n')
+
+    buf.seek(0)
+    cursor.copy_expert(f'COPY {table} FROM STDIN', buf)
+
+
+# --------------------------------------------------
+def copy_value(val: Optional[Any]) -> str:
+    """ Format a value for text-format COPY """
+
+    if val is None:
+        return '\\N'
+
+    return str(val).translate(COPY_ESCAPES)
@@ -0,0 +1,133 @@
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-18
+Purpose: Sync a study's child rows by diffing them against what's stored
+"""
+
+from collections import Counter
+from ct import database
+from typing import Any, Dict, Iterable, List, NamedTuple, Tuple
+
+# Child table -> (primary key, the columns that are a row's content)
+CHILDREN: Dict[str, Tuple[str, List[str]]] = {
+    'study_to_condition': ('study_to_condition_id', ['condition_id']),
+    'study_to_sponsor': ('study_to_sponsor_id', ['sponsor_id']),
+    'study_to_intervention': ('study_to_intervention_id',
+                              ['intervention_id']),
+    'study_doc':
+    ('study_doc_id', ['doc_id', 'doc_type', 'doc_url', 'doc_comment']),
+    'study_outcome': ('study_outcome_id',
+                      ['outcome_type', 'measure', 'time_frame',
+                       'description']),
+    'study_arm_group': ('study_arm_group_id',
+                        ['arm_group_label', 'arm_group_type', 'description']),
+    'study_design': ('study_design_id', [
+        'allocation', 'intervention_model', 'intervention_model_description',
+        'primary_purpose', 'observational_model', 'time_perspective',
+        'masking', 'masking_description'
+    ]),
+    'study_eligibility': ('study_eligibility_id', [
+        'study_pop', 'sampling_method', 'criteria', 'gender', 'gender_based',
+        'gender_description', 'minimum_age', 'maximum_age',
+        'healthy_volunteers'
+    ]),
+    'study_location': ('study_location_id', [
+        'facility_name', 'status', 'contact_name', 'investigator_name'
+    ]),
+    'study_url': ('study_url_id', ['url']),
+}
+
+# Tables keeping every row a study lists, repeats and all, e.g., the many
+# sites named just "Research Site", as the bulk loader does
+REPEATED = {
+    'study_arm_group', 'study_design', 'study_eligibility', 'study_location',
+    'study_url'
+}
+
+# Every stored row of a study in one round trip, as JSON arrays so the
+# tables' different columns come back in one result
+EXISTING = ' UNION ALL '.join(
+    f"SELECT '{table}', {pk}, json_build_array({', '.join(cols)}) "
+    f'FROM {table} WHERE study_id = %(study_id)s'
+    for table, (pk, cols) in CHILDREN.items())
+
+# Child table -> content of the rows a study should have
+Rows = Dict[str, Iterable[Tuple]]
+
+
+class Synced(NamedTuple):
+    """ Rows changed by a sync """
+    inserted: int
+    deleted: int
+
+
+# --------------------------------------------------
+def sync_children(study_id: int, rows: Rows, new: bool = False) -> Synced:
+    """
+    Make the study's child rows match, deleting stored rows that are no
+    longer wanted (or are duplicates) and inserting the missing ones,
+    all in one transaction and one statement batch. Repeats are only
+    kept in the REPEATED tables. A new study has no rows to fetch.
+    """
+
+    with database.atomic():
+        cursor = database.cursor()
+        stored = {} if new else existing(cursor, study_id)
+        statements: List[bytes] = []
+        num_inserted = num_deleted = 0
+
+        for table, (pk, cols) in CHILDREN.items():
+            contents = list(map(tuple, rows.get(table, [])))
+            wanted = Counter(contents) if table in REPEATED else Counter(
+                dict.fromkeys(contents, 1))
+            have = stored.get(table, {})
+
+            # Keep as many stored rows of each content as are wanted
+            deletes = [
+                row_id for content, row_ids in have.items()
+                for row_id in row_ids[wanted[content]:]
+            ]
+
+            # Insert the rest in the order they're listed
+            missing = wanted - Counter(
+                {content: len(row_ids)
+                 for content, row_ids in have.items()})
+            inserts = []
+            for content in contents:
+                if missing[content] > 0:
+                    missing[content] -= 1
+                    inserts.append(content)
+
+            if deletes:
+                statements.append(
+                    cursor.mogrify(f'DELETE FROM {table} WHERE {pk} = ANY(%s)',
+                                   [deletes]))
+                num_deleted += len(deletes)
+
+            if inserts:
+                values = b', '.join(
+                    cursor.mogrify(f'({", ".join(["%s"] * (len(cols) + 1))})',
+                                   (study_id, ) + content)
+                    for content in inserts)
+                statements.append(
+                    f'INSERT INTO {table} (study_id, {", ".join(cols)}) '
+                    'VALUES '.encode() + values)
+                num_inserted += len(inserts)
+
+        if statements:
+            cursor.execute(b';\n'.join(statements))
+
+    return Synced(num_inserted, num_deleted)
+
+
+# --------------------------------------------------
+def existing(cursor: Any, study_id: int) -> Dict[str, Dict[Tuple, List[int]]]:
+    """ A study's stored child rows: table -> content -> row IDs """
+
+    stored: Dict[str, Dict[Tuple, List[int]]] = {}
+    cursor.execute(EXISTING, {'study_id': study_id})
+    for table, row_id, content in cursor.fetchall():
+        stored.setdefault(table, {}).setdefault(tuple(content),
+                                                []).append(row_id)
+
+    return stored
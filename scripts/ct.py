@@ -31,6 +31,7 @@ class Condition(BaseModel):
 
 class Dataload(BaseModel):
     dataload_id = AutoField()
+    started_at = DateTimeField(null=True)
     updated_on = DateField(null=True, unique=True)
 
     class Meta:
@@ -127,6 +128,7 @@ class Study(BaseModel):
     last_known_status = ForeignKeyField(column_name='last_known_status_id',
                                         field='status_id',
                                         model=Status)
+    last_update_posted = DateField(index=True, null=True)
     nct_id = CharField(index=True)
     official_title = TextField(null=True)
     org_study_id = TextField(null=True)
@@ -142,6 +144,7 @@ class Study(BaseModel):
         constraints=[SQL("DEFAULT CURRENT_TIMESTAMP")], null=True)
     source = TextField(null=True)
     start_date = DateField(null=True)
+    study_first_posted = DateField(index=True, null=True)
     study_id = AutoField()
     study_type = ForeignKeyField(column_name='study_type_id',
                                  field='study_type_id',
@@ -243,8 +246,6 @@ class StudyOutcome(BaseModel):
 
     class Meta:
         table_name = 'study_outcome'
-        indexes = ((('study', 'outcome_type', 'measure', 'time_frame',
-                     'description'), False), )
 
 
 class StudyToCondition(BaseModel):
@@ -0,0 +1,60 @@
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-18
+Purpose: Parse the dates found in ClinicalTrials.gov records
+"""
+
+import datetime as dt
+import re
+from functools import lru_cache
+from typing import Optional
+
+MONTHS = {
+    name: num
+    for num, name in enumerate([
+        'January', 'February', 'March', 'April', 'May', 'June', 'July',
+        'August', 'September', 'October', 'November', 'December'
+    ],
+                               start=1)
+}
+
+# "January 2, 2020" or "January 2020", cf. variable_date_type in public.xsd
+CT_DATE = re.compile(r'({}) (?:(\d{{1,2}}), )?(\d{{4}})'.format(
+    '|'.join(MONTHS)))
+
+# "2020-01-02" as written to the JSON by xml2json
+ISO_DATE = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+
+# --------------------------------------------------
+@lru_cache(maxsize=2**16)
+def parse_date(val: str) -> Optional[dt.date]:
+    """ Parse a date string, None if it's empty or not a date """
+
+    if not val or val == 'Unknown':
+        return None
+
+    try:
+        if match := CT_DATE.fullmatch(val):
+            month, day, year = match.groups()
+            return dt.date(int(year), MONTHS[month], int(day or 1))
+
+        if ISO_DATE.fullmatch(val):
+            return dt.date.fromisoformat(val)
+    except ValueError:
+        pass
+
+    return fuzzy_date(val)
+
+
+# --------------------------------------------------
+def fuzzy_date(val: str) -> Optional[dt.date]:
+    """ Let dateparser try anything the fixed formats can't handle """
+
+    # Slow to import and to run, so only pay for it when needed
+    import dateparser
+
+    if dp := dateparser.parse(val):
+        return dp.date()
+
+    return None
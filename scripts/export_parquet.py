@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-18
+Purpose: Export restructured studies to Parquet tables
+"""
+
+import argparse
+import datetime as dt
+import os
+import re
+import pyarrow as pa
+import pyarrow.parquet as pq
+from itertools import chain
+from shards import SHARD_SUFFIXES, read_studies
+from sources import Source, find_sources
+from xml2json import ArmGroup, Intervention, Investigator, Link, \
+    Location, ProtocolOutcome, ProvidedDocument, Reference, Study, StudyDoc
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple, Union, \
+    get_args as type_args, get_origin, get_type_hints
+
+# Top-level Study strings holding ISO dates
+DATE_FIELD = re.compile(r'(_date|_submitted|_qc|_posted)$')
+
+# Child table -> (Study list field, TypedDict of the items or None for str)
+CHILDREN: Dict[str, Tuple[str, Any]] = {
+    'condition': ('conditions', None),
+    'keyword': ('keywords', None),
+    'sponsor': ('sponsors', None),
+    'condition_browse': ('condition_browse', None),
+    'intervention_browse': ('intervention_browse', None),
+    'primary_outcome': ('primary_outcomes', ProtocolOutcome),
+    'secondary_outcome': ('secondary_outcomes', ProtocolOutcome),
+    'other_outcome': ('other_outcomes', ProtocolOutcome),
+    'arm_group': ('arm_groups', ArmGroup),
+    'location': ('locations', Location),
+    'link': ('links', Link),
+    'intervention': ('interventions', Intervention),
+    'overall_official': ('overall_official', Investigator),
+    'reference': ('references', Reference),
+    'study_doc': ('study_docs', StudyDoc),
+    'provided_document': ('provided_documents', ProvidedDocument),
+}
+
+# Column name, path of keys into the record, Arrow type
+Column = Tuple[str, Tuple[str, ...], pa.DataType]
+
+
+class Args(NamedTuple):
+    """ Command-line arguments """
+    files: List[Source]
+    outdir: str
+    batch_size: int
+    compression: str
+    text: bool
+
+
+# --------------------------------------------------
+def get_args() -> Args:
+    """ Get command-line arguments """
+
+    parser = argparse.ArgumentParser(
+        description='Export studies to Parquet',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-d',
+                        '--dir',
+                        help='Input JSON/JSONL directory',
+                        metavar='DIR',
+                        type=str,
+                        nargs='+')
+
+    parser.add_argument('-f',
+                        '--file',
+                        help='Input JSON file(s), JSONL shard(s) or zip '
+                        'archive(s)',
+                        metavar='FILE',
+                        type=str,
+                        nargs='+')
+
+    parser.add_argument('-o',
+                        '--outdir',
+                        help='Output directory',
+                        metavar='DIR',
+                        type=str,
+                        default='parquet')
+
+    parser.add_argument('-B',
+                        '--batch-size',
+                        help='Studies per row group',
+                        metavar='INT',
+                        type=int,
+                        default=10000)
+
+    parser.add_argument('-c',
+                        '--compression',
+                        help='Parquet compression codec',
+                        metavar='STR',
+                        type=str,
+                        choices=['none', 'snappy', 'gzip', 'zstd'],
+                        default='zstd')
+
+    parser.add_argument('-t',
+                        '--text',
+                        help='Include the search "text" in the study table',
+                        action='store_true')
+
+    args = parser.parse_args()
+
+    if not args.file and not args.dir:
+        parser.error('Must indicate either input --file or --dir')
+
+    if args.batch_size < 1:
+        parser.error(f'--batch-size "{args.batch_size}" must be positive')
+
+    if not os.path.isdir(args.outdir):
+        os.makedirs(args.outdir)
+
+    args.file = find_sources(args.file or args.dir,
+                             ('.json', ) + SHARD_SUFFIXES)
+
+    return Args(args.file, args.outdir, args.batch_size, args.compression,
+                args.text)
+
+
+# --------------------------------------------------
+def main() -> None:
+    """ Make a jazz noise here """
+
+    args = get_args()
+    print(f'Exporting {len(args.files):,} files')
+
+    study_columns = [
+        col for col in record_columns(Study, dates=True)
+        if args.text or col[0] != 'text'
+    ]
+    tables: Dict[str, Tuple[List[Column], Callable]] = {
+        'study': (study_columns, lambda data: [data])
+    }
+    for table, (field, item_type) in CHILDREN.items():
+        tables[table] = (child_columns(table, item_type), children(field))
+
+    writers = {
+        table: pq.ParquetWriter(os.path.join(args.outdir, table + '.parquet'),
+                                to_schema(columns),
+                                compression=args.compression)
+        for table, (columns, _) in tables.items()
+    }
+
+    num_studies = 0
+    batch: List[Dict[str, Any]] = []
+    studies = chain.from_iterable(map(read_studies, args.files))
+    for _, data in studies:
+        batch.append(data)
+        if len(batch) == args.batch_size:
+            write_batch(batch, tables, writers)
+            num_studies += len(batch)
+            batch = []
+            print(f'{num_studies:10,} exported')
+
+    if batch:
+        write_batch(batch, tables, writers)
+        num_studies += len(batch)
+
+    for writer in writers.values():
+        writer.close()
+
+    print(f'Done, exported {num_studies:,} studies to "{args.outdir}".')
+
+
+# --------------------------------------------------
+def write_batch(batch: List[Dict[str, Any]],
+                tables: Dict[str, Tuple[List[Column], Callable]],
+                writers: Dict[str, pq.ParquetWriter]) -> None:
+    """ Write one row group of each table for a batch of studies """
+
+    for table, (columns, get_rows) in tables.items():
+        rows = [row for data in batch for row in get_rows(data)]
+        writers[table].write_table(
+            pa.table(
+                {
+                    name: pa.array([value(row, path, typ) for row in rows],
+                                   type=typ)
+                    for name, path, typ in columns
+                },
+                schema=to_schema(columns)))
+
+
+# --------------------------------------------------
+def children(field: str) -> Callable[[Dict[str, Any]], List[Dict[str, Any]]]:
+    """ Function to get a study's child rows from one of its list fields """
+    def get_rows(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [{
+            'nct_id': data['nct_id'],
+            'position': position,
+            'item': item
+        } for position, item in enumerate(data.get(field) or [])]
+
+    return get_rows
+
+
+# --------------------------------------------------
+def child_columns(table: str, item_type: Any) -> List[Column]:
+    """ Columns of a child table: the study, list position and item """
+
+    columns: List[Column] = [('nct_id', ('nct_id', ), pa.string()),
+                             ('position', ('position', ), pa.int32())]
+    if item_type is None:
+        return columns + [(table, ('item', ), pa.string())]
+
+    return columns + [(name, ('item', ) + path, typ)
+                      for name, path, typ in record_columns(item_type)]
+
+
+# --------------------------------------------------
+def record_columns(record: Any, dates: bool = False) -> List[Column]:
+    """
+    Columns for the scalar fields of a TypedDict, flattening nested
+    records into "parent_child" columns and skipping lists of records,
+    which become child tables
+    """
+
+    columns: List[Column] = []
+    for name, typ in get_type_hints(record).items():
+        if get_origin(typ) is Union:
+            typ = next(arg for arg in type_args(typ) if arg is not type(None))
+
+        if isinstance(typ, type) and issubclass(typ, dict):
+            columns.extend((f'{name}_{sub}', (name, ) + path, sub_type)
+                           for sub, path, sub_type in record_columns(typ))
+        elif typ is str:
+            date = dates and DATE_FIELD.search(name)
+            columns.append(
+                (name, (name, ), pa.date32() if date else pa.string()))
+        elif typ is int:
+            columns.append((name, (name, ), pa.int64()))
+        elif typ == List[str] and record is not Study:
+            columns.append((name, (name, ), pa.list_(pa.string())))
+
+    return columns
+
+
+# --------------------------------------------------
+def to_schema(columns: List[Column]) -> pa.Schema:
+    """ Arrow schema for the columns """
+
+    return pa.schema([(name, typ) for name, _, typ in columns])
+
+
+# --------------------------------------------------
+def value(row: Dict[str, Any], path: Tuple[str, ...],
+          typ: pa.DataType) -> Any:
+    """ Value at the path into the row converted for the column type """
+
+    val: Any = row
+    for key in path:
+        if not isinstance(val, dict):
+            return None
+        val = val.get(key)
+
+    if val in (None, ''):
+        return None
+
+    if typ == pa.date32():
+        return dt.date.fromisoformat(val)
+
+    if typ == pa.int64():
+        return int(val)
+
+    return val
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
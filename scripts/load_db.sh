@@ -6,11 +6,15 @@
 #
 
 #
-# Make working directory, remove old data
+# Make working directory, remove old downloads.
+# The JSON and manifest persist across downloads, so they live outside it.
 #
-DATA_DIR="/usr/local/cpath/clinicaltrials.gov/data"
+BASE_DIR="/usr/local/cpath/clinicaltrials.gov"
+DATA_DIR="$BASE_DIR/data"
+STATE_DIR="$BASE_DIR/state"
 [[ ! -d "$DATA_DIR" ]] && mkdir "$DATA_DIR"
-rm -rf "$DATA_DIR/*"
+[[ ! -d "$STATE_DIR" ]] && mkdir "$STATE_DIR"
+rm -rf "${DATA_DIR:?}"/*
 
 #
 # Download the latest XML
@@ -22,22 +26,25 @@ echo "Working in \"$XML_DIR\""
 cd "$XML_DIR"
 XML_FILE="AllPublicXML.zip"
 [[ ! -f "$XML_FILE" ]] && wget https://clinicaltrials.gov/AllPublicXML.zip
-[[ ! -f "Contents.txt" ]] && unzip "$XML_FILE" # Don't unzip twice
 
 #
-# Load Pg
+# Convert straight from the archive, no need to unzip.
+# The JSON and manifest persist across downloads so that only documents
+# whose XML changed are converted again.
 #
-LOADER_DIR="/usr/local/cpath/clinicaltrials.gov/ctloader"
-LOADER="$LOADER_DIR/target/release/ctloader"
-if [[ ! -f "$LOADER" ]]; then
-    echo "Missing LOADER \"$LOADER\""
-    exit 1
-fi
-
-cd "$LOADER_DIR" # Need .env file there
-$LOADER --force "$XML_DIR"
+SCRIPTS="$BASE_DIR/lib/scripts"
+JSON_DIR="$STATE_DIR/json"
+"$SCRIPTS/xml2json.py" -s "$SCRIPTS/public.xsd" -f "$XML_FILE" \
+    -o "$JSON_DIR" --workers 16 --manifest "$STATE_DIR/manifest.db"
 
-echo "Updating tsvec field"
-SQL="/usr/local/cpath/clinicaltrials.gov/lib/scripts/tsvec.sql"
-HOST="postgres-prod.cnw0jywsbq0l.us-west-2.rds.amazonaws.com"
-psql -h "$HOST" -U kyclark clinical_trial < "$SQL"
+#
+# Load Pg, skipping studies that haven't changed since the last load.
+# With RELOAD=1, load everything into a shadow schema instead and swap it
+# in once indexed, so searches never see a partial load.
+#
+if [[ -n "${RELOAD:-}" ]]; then
+    "$SCRIPTS/load_pg.py" --dir "$JSON_DIR" --bulk --jobs 8 \
+        --reload "$SCRIPTS/../sql/pg_schema.sql"
+else
+    "$SCRIPTS/load_pg.py" --dir "$JSON_DIR" --bulk --incremental --jobs 8
+fi
@@ -6,25 +6,56 @@ Purpose: Rock the Casbah
 """
 
 import argparse
-import dateparser
+import asyncio
 import datetime as dt
-import json
 import os
+import shadow
 import signal
 import sys
 import shutil
 import tempfile
-from pathlib import Path
+from async_bulk import Item, load_all
+from bulk import BulkLoader
+from itertools import chain
+from shards import SHARD_SUFFIXES, is_shard, read_studies
+from sources import Source, find_sources
 from pprint import pprint
-from ct import Study, Condition, StudyToCondition, StudyToSponsor, Sponsor, \
-    Intervention, StudyToIntervention, StudyDoc, StudyOutcome, Phase
-from typing import Optional, List, NamedTuple, TextIO
+from childsync import sync_children
+from ct import database, Dataload, Study
+from lookup import Counts, Lookups, counts, load_lookups, report
+from metrics import Metrics, Sample
+from records import StudyRecord, to_record
+from multiprocessing import Pool
+from peewee import SQL, fn
+from typing import Callable, Dict, Iterator, Optional, List, \
+    NamedTuple, Set, TextIO, Tuple
+
+# NCT ID -> last_update_posted of the loaded studies
+Updates = Dict[str, Optional[dt.date]]
+
+# Set per worker process by init_worker() with --jobs
+WORKER_LOOKUPS: Optional[Lookups] = None
+WORKER_STORED: Optional[Updates] = None
+WORKER_DONE: Set[str] = set()
+WORKER_BATCH_SIZE = 1000
+WORKER_FULLTEXT_LOAD = True
+
+# Stage times of this process; a worker's go back with each batch
+METRICS = Metrics()
 
 
 class Args(NamedTuple):
     """ Command-line arguments """
-    files: List[str]
+    files: List[Source]
     progress: Optional[TextIO]
+    bulk: bool
+    batch_size: int
+    jobs: int
+    in_flight: int
+    incremental: bool
+    fulltext_load: bool
+    metrics: Optional[str]
+    reload: Optional[str]
 
 
 # --------------------------------------------------
@@ -37,14 +68,15 @@ def get_args() -> Args:
 
     parser.add_argument('-d',
                         '--dir',
-                        help='Input JSON directory',
+                        help='Input JSON/JSONL directory',
                         metavar='DIR',
                         type=str,
                         nargs='+')
 
     parser.add_argument('-f',
                         '--file',
-                        help='Input JSON file(s)',
+                        help='Input JSON file(s), JSONL shard(s) or zip '
+                        'archive(s)',
                         metavar='FILE',
                         type=str,
                         nargs='+')
@@ -55,18 +87,87 @@ def get_args() -> Args:
                         metavar='FILE',
                         type=str)
 
+    parser.add_argument('-b',
+                        '--bulk',
+                        help='Load in batches with COPY',
+                        action='store_true')
+
+    parser.add_argument('-B',
+                        '--batch-size',
+                        help='Studies per batch with --bulk or --jobs',
+                        metavar='INT',
+                        type=int,
+                        default=1000)
+
+    parser.add_argument('-j',
+                        '--jobs',
+                        help='Number of worker processes',
+                        metavar='INT',
+                        type=int,
+                        default=1)
+
+    parser.add_argument('-a',
+                        '--async',
+                        help='Load in batches with asyncpg, this many in '
+                        'flight while the next are decoded',
+                        metavar='INT',
+                        dest='in_flight',
+                        type=int,
+                        default=0)
+
+    parser.add_argument('-i',
+                        '--incremental',
+                        help='Only load new studies or those updated since '
+                        'their last load',
+                        action='store_true')
+
+    parser.add_argument('-n',
+                        '--no-fulltext-load',
+                        help='Only store the search vector, not the text it '
+                        'was made from',
+                        dest='fulltext_load',
+                        action='store_false')
+
+    parser.add_argument('-M',
+                        '--metrics',
+                        help='Write stage timings and latencies as JSON',
+                        metavar='FILE',
+                        type=str)
+
+    parser.add_argument('-R',
+                        '--reload',
+                        help='Reload everything into a shadow schema built '
+                        'from this pg_dump schema, then swap it in',
+                        metavar='SQL',
+                        type=str)
+
     args = parser.parse_args()
 
-    if args.dir and not args.file:
-        filenames = []
-        for dirname in args.dir:
-            if not os.path.isdir(dirname):
-                dirname = os.path.abspath(dirname)
-            filenames.extend(list(Path(dirname).rglob('*.json')))
+    if args.batch_size < 1:
+        parser.error(f'--batch-size "{args.batch_size}" must be positive')
+
+    if args.jobs < 1:
+        parser.error(f'--jobs "{args.jobs}" must be positive')
+
+    if args.in_flight < 0:
+        parser.error(f'--async "{args.in_flight}" must not be negative')
+
+    if args.in_flight and args.jobs > 1:
+        parser.error('--async cannot be used with --jobs')
 
-        args.file = filenames
+    if args.reload:
+        if not os.path.isfile(args.reload):
+            parser.error(f'--reload "{args.reload}" is not a file')
+        if args.incremental or args.progress:
+            parser.error('--reload loads everything, it cannot be used '
+                         'with --incremental or --progress')
 
-    return Args(args.file, args.progress)
+    args.file = find_sources(args.file or args.dir or [],
+                             ('.json', ) + SHARD_SUFFIXES)
+
+    return Args(args.file, args.progress, args.bulk, args.batch_size,
+                args.jobs, args.in_flight, args.incremental,
+                args.fulltext_load, args.metrics, args.reload)
 
 
 # --------------------------------------------------
@@ -74,6 +175,7 @@ def main() -> None:
     """ Make a jazz noise here """
 
     args = get_args()
+    plan = shadow.create(args.reload) if args.reload else None
 
     done = set()
 
@@ -94,128 +196,386 @@ def main() -> None:
 
     signal.signal(signal.SIGINT, handler)
 
+    def record(names: List[str]) -> None:
+        for name in names:
+            progress_fh.write(name + '\n')
+        progress_fh.flush()
+
     print(f'Processing {len(args.files):,} files')
 
-    for i, file in enumerate(args.files, start=1):
-        basename = os.path.basename(file)
-        print(f'{i:5}: Processing "{basename}"')
+    stored = stored_updates() if args.incremental else None
+    started = load_started()
 
-        if basename in done:
-            print('Skipping')
-            continue
+    if args.jobs > 1 or args.in_flight:
+        lookup_counts = None
+        if args.in_flight:
+            num_unchanged = run_async(args, stored, done, record)
+        else:
+            todo = [f for f in args.files if f.name not in done]
+            num_unchanged, lookup_counts = run_jobs(todo, args, stored,
+                                                    done, record)
+        if plan:
+            shadow.finish(plan, METRICS)
+        record_dataload(started)
+        cleanup()
+        if stored is not None:
+            print(f'{num_unchanged:,} unchanged')
+        if lookup_counts:
+            print(report(lookup_counts))
+        report_metrics(args.metrics)
+        print('Done.')
+        return
+
+    loader = BulkLoader(args.batch_size, args.fulltext_load,
+                        METRICS) if args.bulk else None
+    lookups = None if args.bulk else load_lookups()
+    num_unchanged = 0
+
+    # Studies read since the last was loaded, sharing the time since
+    pending = 0
+    studies = chain.from_iterable(
+        read_studies(file, done) for file in args.files)
+    for i, (basename, data) in enumerate(METRICS.timed('read', studies),
+                                         start=1):
+        print(f'{i:5}: Processing "{basename}"')
+        pending += 1
+        with METRICS.stage('record'):
+            study = to_record(data)
+
+        if stored is not None and not is_changed(study, stored):
+            print('Unchanged')
+            num_unchanged += 1
+            record([basename])
+            if loader:
+                continue
+        elif loader:
+            if not (loaded := loader.add(study, basename)):
+                continue
+            record(loaded)
+        else:
+            load_study(study, lookups, args.fulltext_load)
 
-        data = json.loads(open(file).read())
+            # Record progress
+            record([basename])
 
-        phase, _ = Phase.get_or_create(phase=data['phase'] or 'N/A')
+        METRICS.done(pending)
+        pending = 0
 
-        study = None
-        if studies := Study.select().where(Study.nct_id == data['nct_id']):
-            study = studies[0]
-        else:
-            study, _ = Study.get_or_create(nct_id=data['nct_id'],
-                                           phase_id=phase.phase_id)
-
-        study.acronym = data['acronym']
-        study.biospec_description = data['biospec_description']
-        study.biospec_retention = data['biospec_retention']
-        study.brief_summary = data['brief_summary']
-        study.brief_title = data['brief_title']
-        study.detailed_description = data['detailed_description']
-        study.has_expanded_access = data['has_expanded_access']
-        study.last_known_status = data['last_known_status']
-        study.official_title = data['official_title']
-        study.org_study_id = data['org_study_id']
-        study.overall_status = data['overall_status']
-        study.phase_id = phase.phase_id
-        study.rank = data['rank']
-        study.source = data['source']
-        study.study_type = data['study_type']
-        study.target_duration = data['target_duration']
-        study.why_stopped = data['why_stopped']
-        study.text = data['text']
-
-        # dates
-        study.start_date = to_date(data['start_date'])
-        study.completion_date = to_date(data['completion_date'])
-        study.disposition_first_posted = to_date(
-            data['disposition_first_posted'])
-        study.disposition_first_submitted = to_date(
-            data['disposition_first_submitted'])
-        study.disposition_first_submitted_qc = to_date(
-            data['disposition_first_submitted_qc'])
-        study.last_update_posted = to_date(data['last_update_posted'])
-        study.last_update_submitted = to_date(data['last_update_submitted'])
-        study.last_update_submitted_qc = to_date(
-            data['last_update_submitted_qc'])
-        study.primary_completion_date = to_date(
-            data['primary_completion_date'])
-        study.results_first_posted = to_date(data['results_first_posted'])
-        study.results_first_submitted = to_date(
-            data['results_first_submitted'])
-        study.results_first_submitted_qc = to_date(
-            data['results_first_submitted_qc'])
-        study.study_first_posted = to_date(data['study_first_posted'])
-        study.study_first_submitted = to_date(data['study_first_submitted'])
-        study.study_first_submitted_qc = to_date(
-            data['study_first_submitted_qc'])
-        study.verification_date = to_date(data['verification_date'])
-        study.keywords = ', '.join(data['keywords'])
-        study.save()
-
-        for condition in data.get('conditions'):
-            cond, _ = Condition.get_or_create(condition=condition)
-            s2c, _ = StudyToCondition.get_or_create(
-                study_id=study.study_id, condition_id=cond.condition_id)
-
-        for sponsor in data.get('sponsors'):
-            spon, _ = Sponsor.get_or_create(sponsor=sponsor)
-            s2s, _ = StudyToSponsor.get_or_create(study_id=study.study_id,
-                                                  sponsor_id=spon.sponsor_id)
-
-        for doc in data.get('study_docs'):
-            study_doc, _ = StudyDoc.get_or_create(study_id=study.study_id,
-                                                  doc_id=doc['doc_id'])
-
-            study_doc.doc_type = doc['doc_type']
-            study_doc.doc_url = doc['doc_url']
-            study_doc.doc_comment = doc['doc_comment']
-            study_doc.save()
-
-        outcome_types = [
-            'primary_outcomes', 'secondary_outcomes', 'other_outcomes'
-        ]
-
-        for outcome_type in outcome_types:
-            for outcome in data.get(outcome_type, []):
-                study_outcome, _ = StudyOutcome.get_or_create(
-                    study_id=study.study_id,
-                    outcome_type=outcome_type.replace('_outcomes', ''),
-                    measure=outcome['measure'],
-                    time_frame=outcome['time_frame'],
-                    description=outcome['description'])
-
-        if interventions := data.get('interventions'):
-            for intervention in interventions:
-                int_, _ = Intervention.get_or_create(
-                    intervention=intervention['intervention_name'])
-                i2c, _ = StudyToIntervention.get_or_create(
-                    study_id=study.study_id,
-                    intervention_id=int_.intervention_id)
-
-        # Record progress
-        progress_fh.write(basename + '\n')
-        progress_fh.flush()
+    if loader:
+        record(loader.flush())
+        METRICS.done(pending)
 
+    if plan:
+        shadow.finish(plan, METRICS)
+    record_dataload(started)
     cleanup()
+
+    if stored is not None:
+        print(f'{num_unchanged:,} unchanged')
+
+    if lookups:
+        print(report(counts(lookups)))
+
+    report_metrics(args.metrics)
     print('Done.')
 
 
 # --------------------------------------------------
-def to_date(val: str):
-    """ String to date() """
+def report_metrics(filename: Optional[str]) -> None:
+    """ Print the stage timings and write them to the file, if any """
+
+    print(METRICS.report())
+    if filename:
+        METRICS.write(filename)
+
+
+# --------------------------------------------------
+def run_jobs(files: List[Source], args: Args, stored: Optional[Updates],
+             done: Set[str], record: Callable[[List[str]], None]
+             ) -> Tuple[int, Optional[Counts]]:
+    """
+    Load batches of files with a pool of long-lived workers, each shard
+    being a batch of its own.
+    Returns the number of unchanged studies and the lookup cache counts.
+    """
+
+    shards = [[file] for file in files if is_shard(file.name)]
+    singles = [file for file in files if not is_shard(file.name)]
+    batches = shards + [
+        singles[i:i + args.batch_size]
+        for i in range(0, len(singles), args.batch_size)
+    ]
+    print(f'Loading {len(files):,} files in {len(batches):,} batches '
+          f'with {args.jobs} workers')
+
+    # Each worker opens its own connection
+    database.close()
+
+    num_loaded = 0
+    num_unchanged = 0
+    worker_counts: Dict[int, Counts] = {}
+    with Pool(args.jobs,
+              initializer=init_worker,
+              initargs=(args.bulk, stored, done, args.batch_size,
+                        args.fulltext_load)) as pool:
+        for pid, names, unchanged, batch_counts, sample in \
+                pool.imap_unordered(load_batch, batches):
+            record(names)
+            METRICS.add(sample)
+            worker_counts[pid] = batch_counts
+            num_loaded += len(names)
+            num_unchanged += unchanged
+            print(f'{num_loaded:8,} studies loaded')
+
+    if args.bulk:
+        return num_unchanged, None
+
+    totals: Dict[str, Tuple[int, int]] = {}
+    for lookup_counts in worker_counts.values():
+        for name, (hits, misses) in lookup_counts.items():
+            prev_hits, prev_misses = totals.get(name, (0, 0))
+            totals[name] = (prev_hits + hits, prev_misses + misses)
+
+    return num_unchanged, totals
+
+
+# --------------------------------------------------
+def run_async(args: Args, stored: Optional[Updates], done: Set[str],
+              record: Callable[[List[str]], None]) -> int:
+    """
+    Load batches with asyncio, reading and decoding the next while
+    others are being written. Returns the number of unchanged studies.
+    """
+
+    num_unchanged = 0
+    num_loaded = 0
+
+    def items() -> Iterator[Item]:
+        nonlocal num_unchanged
+        studies = chain.from_iterable(
+            read_studies(file, done) for file in args.files)
+        for basename, data in METRICS.timed('read', studies):
+            with METRICS.stage('record'):
+                study = to_record(data)
+
+            if stored is not None and not is_changed(study, stored):
+                num_unchanged += 1
+                yield basename, None
+            else:
+                yield basename, study
+
+    def loaded(names: List[str]) -> None:
+        nonlocal num_loaded
+        record(names)
+        num_loaded += len(names)
+        if names:
+            print(f'{num_loaded:8,} studies loaded')
+
+    print(f'Loading with {args.in_flight} batches in flight')
+    asyncio.run(
+        load_all(items(), loaded, args.batch_size, args.in_flight,
+                 args.fulltext_load, METRICS))
+
+    return num_unchanged
+
+
+# --------------------------------------------------
+def init_worker(bulk: bool, stored: Optional[Updates], done: Set[str],
+                batch_size: int, fulltext_load: bool) -> None:
+    """ Connect a worker process and, to load rows, build its caches """
+
+    global WORKER_LOOKUPS, WORKER_STORED, WORKER_DONE, WORKER_BATCH_SIZE, \
+        WORKER_FULLTEXT_LOAD, METRICS
 
-    if dp := dateparser.parse(val):
-        return dt.datetime.utcfromtimestamp(dp.timestamp())
+    # The parent handles ^C and records progress
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    database.connect()
+    WORKER_LOOKUPS = None if bulk else load_lookups()
+    WORKER_STORED = stored
+    WORKER_DONE = done
+    WORKER_BATCH_SIZE = batch_size
+    WORKER_FULLTEXT_LOAD = fulltext_load
+    METRICS = Metrics()
+
+
+# --------------------------------------------------
+def load_batch(
+        files: List[Source]) -> Tuple[int, List[str], int, Counts, Sample]:
+    """
+    Load a batch of files in a worker.
+    Returns the worker's PID, the names done, the number unchanged, the
+    worker's lookup cache counts and the batch's metrics.
+    """
+
+    names: List[str] = []
+    num_unchanged = 0
+    loader = None if WORKER_LOOKUPS is not None else BulkLoader(
+        WORKER_BATCH_SIZE, WORKER_FULLTEXT_LOAD, METRICS)
+    METRICS.mark()
+    pending = 0
+    studies = chain.from_iterable(
+        read_studies(file, WORKER_DONE) for file in files)
+    for basename, data in METRICS.timed('read', studies):
+        pending += 1
+        with METRICS.stage('record'):
+            study = to_record(data)
+
+        if WORKER_STORED is not None and not is_changed(study,
+                                                        WORKER_STORED):
+            num_unchanged += 1
+            names.append(basename)
+            if loader:
+                continue
+        elif loader:
+            if not (loaded := loader.add(study, basename)):
+                continue
+            names.extend(loaded)
+        else:
+            load_study(study, WORKER_LOOKUPS, WORKER_FULLTEXT_LOAD)
+            names.append(basename)
+
+        METRICS.done(pending)
+        pending = 0
+
+    if loader:
+        names.extend(loader.flush())
+        METRICS.done(pending)
+        return os.getpid(), names, num_unchanged, {}, METRICS.take()
+
+    return os.getpid(), names, num_unchanged, counts(
+        WORKER_LOOKUPS), METRICS.take()
+
+
+# --------------------------------------------------
+def stored_updates() -> Updates:
+    """ The last_update_posted of every study already loaded """
+
+    return dict(Study.select(Study.nct_id, Study.last_update_posted).tuples())
+
+
+# --------------------------------------------------
+def is_changed(study: StudyRecord, stored: Updates) -> bool:
+    """ Whether a study is new or was updated after it was loaded """
+
+    if study.nct_id not in stored:
+        return True
+
+    prev = stored[study.nct_id]
+    posted = study.last_update_posted
+    return prev is None or posted is None or posted > prev
+
+
+# --------------------------------------------------
+def load_started() -> dt.datetime:
+    """ When a load starts, by the DB's clock that stamps the studies """
+
+    return database.execute_sql('SELECT LOCALTIMESTAMP').fetchone()[0]
+
+
+# --------------------------------------------------
+def record_dataload(started: dt.datetime) -> None:
+    """
+    Note today's load in the dataload table. Of several loads in a day,
+    keep when the latest started, where alerts for it start.
+    """
+
+    Dataload.insert(updated_on=dt.date.today(),
+                    started_at=started).on_conflict(
+                        conflict_target=[Dataload.updated_on],
+                        update={
+                            Dataload.started_at: SQL('EXCLUDED.started_at')
+                        }).execute()
+
+
+# --------------------------------------------------
+def load_study(record: StudyRecord,
+               lookups: Lookups,
+               fulltext_load: bool = True) -> None:
+    """ Load one study a row at a time, syncing its children """
+
+    with METRICS.stage('db study'):
+        study, created = save_study(record, lookups, fulltext_load)
+
+    with METRICS.stage('db children'):
+        sync_children(
+            study.study_id, {
+                'study_to_condition':
+                [(lookups.condition.get(name), )
+                 for name in record.conditions],
+                'study_to_sponsor':
+                [(lookups.sponsor.get(name), ) for name in record.sponsors],
+                'study_to_intervention':
+                [(lookups.intervention.get(name), )
+                 for name in record.interventions],
+                'study_doc': record.docs,
+                'study_outcome': record.outcomes,
+                'study_arm_group': record.arm_groups,
+                'study_design': [record.design] if record.design else [],
+                'study_eligibility':
+                [record.eligibility] if record.eligibility else [],
+                'study_location': record.locations,
+                'study_url': [(url, ) for url in record.urls],
+            }, created)
+
+
+# --------------------------------------------------
+def save_study(record: StudyRecord, lookups: Lookups,
+               fulltext_load: bool) -> Tuple[Study, bool]:
+    """ Insert or update the study row, also saying if it's new """
+
+    study = None
+    created = False
+    if studies := Study.select().where(Study.nct_id == record.nct_id):
+        study = studies[0]
+    else:
+        study = Study(nct_id=record.nct_id)
+        created = True
+
+    study.acronym = record.acronym
+    study.biospec_description = record.biospec_description
+    study.biospec_retention = record.biospec_retention
+    study.brief_summary = record.brief_summary
+    study.brief_title = record.brief_title
+    study.detailed_description = record.detailed_description
+    study.enrollment = record.enrollment
+    study.has_expanded_access = record.has_expanded_access
+    study.last_known_status_id = lookups.status.get(record.last_known_status)
+    study.official_title = record.official_title
+    study.org_study_id = record.org_study_id
+    study.overall_status_id = lookups.status.get(record.overall_status)
+    study.phase_id = lookups.phase.get(record.phase)
+    study.rank = record.rank
+    study.source = record.source
+    study.study_type_id = lookups.study_type.get(record.study_type)
+    study.target_duration = record.target_duration
+    study.why_stopped = record.why_stopped
+    study.fulltext_load = record.text if fulltext_load else None
+    study.fulltext = fn.to_tsvector('english', record.text)
+
+    # dates
+    study.start_date = record.start_date
+    study.completion_date = record.completion_date
+    study.disposition_first_posted = record.disposition_first_posted
+    study.disposition_first_submitted = record.disposition_first_submitted
+    study.disposition_first_submitted_qc = \
+        record.disposition_first_submitted_qc
+    study.last_update_posted = record.last_update_posted
+    study.last_update_submitted = record.last_update_submitted
+    study.last_update_submitted_qc = record.last_update_submitted_qc
+    study.primary_completion_date = record.primary_completion_date
+    study.results_first_posted = record.results_first_posted
+    study.results_first_submitted = record.results_first_submitted
+    study.results_first_submitted_qc = record.results_first_submitted_qc
+    study.study_first_posted = record.study_first_posted
+    study.study_first_submitted = record.study_first_submitted
+    study.study_first_submitted_qc = record.study_first_submitted_qc
+    study.verification_date = record.verification_date
+    study.keywords = record.keywords
+    study.record_last_updated = SQL('CURRENT_TIMESTAMP')
+    study.save()
+
+    return study, created
 
 
 # --------------------------------------------------
@@ -0,0 +1,92 @@
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-18
+Purpose: In-memory name -> ID caches for the lookup tables
+"""
+
+from ct import BaseModel, Condition, Intervention, Phase, Sponsor, Status, \
+    StudyType
+from typing import Dict, List, NamedTuple, Tuple, Type
+
+# Cache name -> (hits, misses)
+Counts = Dict[str, Tuple[int, int]]
+
+
+# --------------------------------------------------
+class Lookup:
+    """ Cache of one lookup table's name -> ID """
+    def __init__(self, model: Type[BaseModel], name_field: str,
+                 id_field: str) -> None:
+        self.model = model
+        self.name_field = name_field
+        self.id_field = id_field
+        self.ids: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def load(self) -> 'Lookup':
+        """ Preload every existing name with one SELECT """
+
+        name, id_ = (getattr(self.model, fld)
+                     for fld in (self.name_field, self.id_field))
+        self.ids = dict(self.model.select(name, id_).tuples())
+        return self
+
+    def get(self, name: str) -> int:
+        """ ID for the name, inserting the name if it's new """
+
+        if (id_ := self.ids.get(name)) is not None:
+            self.hits += 1
+            return id_
+
+        self.misses += 1
+        row, _ = self.model.get_or_create(**{self.name_field: name})
+        id_ = self.ids[name] = getattr(row, self.id_field)
+        return id_
+
+
+# --------------------------------------------------
+class Lookups(NamedTuple):
+    """ Caches for all the lookup tables """
+    phase: Lookup
+    study_type: Lookup
+    status: Lookup
+    condition: Lookup
+    sponsor: Lookup
+    intervention: Lookup
+
+
+# --------------------------------------------------
+def load_lookups() -> Lookups:
+    """ Build and preload all the lookup caches """
+
+    return Lookups(
+        phase=Lookup(Phase, 'phase_name', 'phase_id').load(),
+        study_type=Lookup(StudyType, 'study_type_name',
+                          'study_type_id').load(),
+        status=Lookup(Status, 'status_name', 'status_id').load(),
+        condition=Lookup(Condition, 'condition_name', 'condition_id').load(),
+        sponsor=Lookup(Sponsor, 'sponsor_name', 'sponsor_id').load(),
+        intervention=Lookup(Intervention, 'intervention_name',
+                            'intervention_id').load())
+
+
+# --------------------------------------------------
+def counts(lookups: Lookups) -> Counts:
+    """ (hits, misses) for each cache """
+
+    return {
+        name: (lookup.hits, lookup.misses)
+        for name, lookup in lookups._asdict().items()
+    }
+
+
+# --------------------------------------------------
+def report(counts: Counts) -> str:
+    """ Format hit/miss counts for each cache """
+
+    lines: List[str] = [f'{"Lookup":15} {"Hits":>10} {"Misses":>10}']
+    for name, (hits, misses) in counts.items():
+        lines.append(f'{name:15} {hits:10,} {misses:10,}')
+
+    return '\n'.join(lines)
@@ -0,0 +1,52 @@
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-18
+Purpose: SQLite manifest of converted documents' content hashes
+"""
+
+import hashlib
+import sqlite3
+from typing import Dict, Iterable, Tuple
+
+# Document name -> (content hash, output file)
+Entries = Dict[str, Tuple[str, str]]
+
+
+# --------------------------------------------------
+class Manifest:
+    """ Persistent record of what each document hashed to and produced """
+    def __init__(self, filename: str) -> None:
+        self.db = sqlite3.connect(filename)
+        self.db.execute('create table if not exists manifest ('
+                        'name text primary key, '
+                        'digest text not null, '
+                        'output text not null)')
+
+    def load(self) -> Entries:
+        """ All the entries """
+
+        return {
+            name: (digest, output)
+            for name, digest, output in self.db.execute(
+                'select name, digest, output from manifest')
+        }
+
+    def update(self, entries: Iterable[Tuple[str, str, str]]) -> None:
+        """ Add or replace (name, digest, output) entries """
+
+        with self.db:
+            self.db.executemany(
+                'insert or replace into manifest (name, digest, output) '
+                'values (?, ?, ?)', entries)
+
+    def close(self) -> None:
+        """ Close the database """
+
+        self.db.close()
+
+
+# --------------------------------------------------
+def content_hash(data: bytes) -> str:
+    """ Hash of a document's bytes """
+
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
@@ -0,0 +1,150 @@
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-18
+Purpose: Wall/CPU time per pipeline stage and per-document latency
+"""
+
+import math
+import time
+from contextlib import contextmanager
+from serialize import dumps
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, TypeVar
+
+# Stage -> (wall, CPU) seconds
+Timings = Dict[str, Tuple[float, float]]
+
+# What a worker hands back to be added to the run's totals
+Sample = Tuple[Timings, List[float]]
+
+T = TypeVar('T')
+
+
+# --------------------------------------------------
+class Metrics:
+    """ Stage times and document latencies, totalled across processes """
+    def __init__(self) -> None:
+        self.stages: Timings = {}
+        self.latencies: List[float] = []
+        self.start = self.last = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """ Add the wall and CPU time of the block to the stage """
+
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            prev_wall, prev_cpu = self.stages.get(name, (0., 0.))
+            self.stages[name] = (prev_wall + time.perf_counter() - wall,
+                                 prev_cpu + time.process_time() - cpu)
+
+    def timed(self, name: str, items: Iterable[T]) -> Iterator[T]:
+        """ Iterate, timing each step of the iterator as the stage """
+
+        it = iter(items)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+            yield item
+
+    def mark(self) -> None:
+        """ Start timing the next document(s) from now """
+
+        self.last = time.perf_counter()
+
+    def done(self, num: int = 1) -> None:
+        """
+        Note documents finished, sharing the time since the last mark
+        between them, e.g., a batch's time per document
+        """
+
+        if num > 0:
+            now = time.perf_counter()
+            self.latencies.extend([(now - self.last) / num] * num)
+            self.last = now
+
+    def take(self) -> Sample:
+        """ The timings and latencies so far, starting afresh """
+
+        sample = self.stages, self.latencies
+        self.stages, self.latencies = {}, []
+        return sample
+
+    def add(self, sample: Sample) -> None:
+        """ Add a worker's sample """
+
+        stages, latencies = sample
+        for name, (wall, cpu) in stages.items():
+            prev_wall, prev_cpu = self.stages.get(name, (0., 0.))
+            self.stages[name] = (prev_wall + wall, prev_cpu + cpu)
+        self.latencies.extend(latencies)
+
+    def summary(self) -> Dict[str, Any]:
+        """ Throughput, latency percentiles and stage totals """
+
+        wall = time.perf_counter() - self.start
+        latencies = sorted(self.latencies)
+        stage_wall = sum(wall for wall, _ in self.stages.values()) or 1.
+
+        return {
+            'documents': len(latencies),
+            'wall_secs': round(wall, 3),
+            'docs_per_sec': round(len(latencies) / wall, 1) if wall else 0.,
+            'latency_ms': {
+                'mean':
+                round(1000 * sum(latencies) / len(latencies), 3)
+                if latencies else 0.,
+                'p50': round(1000 * percentile(latencies, 50), 3),
+                'p95': round(1000 * percentile(latencies, 95), 3),
+                'p99': round(1000 * percentile(latencies, 99), 3),
+                'max': round(1000 * percentile(latencies, 100), 3),
+            },
+            'stages': {
+                name: {
+                    'wall_secs': round(wall, 6),
+                    'cpu_secs': round(cpu, 6),
+                    'share': round(wall / stage_wall, 4),
+                }
+                for name, (wall, cpu) in self.stages.items()
+            },
+        }
+
+    def report(self) -> str:
+        """ The summary as a table """
+
+        summary = self.summary()
+        lines = [f'{"Stage":24} {"Wall s":>10} {"CPU s":>10} {"Share":>7}']
+        for name, stage in summary['stages'].items():
+            lines.append(f'{name:24} {stage["wall_secs"]:10.3f} '
+                         f'{stage["cpu_secs"]:10.3f} '
+                         f'{stage["share"]:7.1%}')
+
+        latency = summary['latency_ms']
+        lines.append(f'{summary["documents"]:,} documents in '
+                     f'{summary["wall_secs"]:,.1f}s, '
+                     f'{summary["docs_per_sec"]:,.1f} docs/sec, latency '
+                     f'p50 {latency["p50"]:.1f} ms, '
+                     f'p95 {latency["p95"]:.1f} ms, '
+                     f'p99 {latency["p99"]:.1f} ms')
+
+        return '\n'.join(lines)
+
+    def write(self, filename: str) -> None:
+        """ Write the summary as JSON """
+
+        with open(filename, 'wb') as fh:
+            fh.write(dumps(self.summary(), indent=True) + b'\n')
+
+
+# --------------------------------------------------
+def percentile(values: List[float], pct: float) -> float:
+    """ Nearest-rank percentile of sorted values """
+
+    if not values:
+        return 0.
+
+    return values[max(math.ceil(pct / 100 * len(values)), 1) - 1]
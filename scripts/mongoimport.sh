@@ -16,7 +16,12 @@ i=0
 for FILE in json/*; do
     # i=$((i+1))
     # printf "%6d: %s\r" $i $FILE
-    echo "mongoimport --quiet -d $DB -c $COLL $FILE" >> "$JOBS"
+    # JSONL shards from "xml2json.py --jsonl" import the same way
+    case "$FILE" in
+        *.gz)  echo "mongoimport --quiet --gzip -d $DB -c $COLL $FILE" ;;
+        *.zst) echo "zstdcat $FILE | mongoimport --quiet -d $DB -c $COLL" ;;
+        *)     echo "mongoimport --quiet -d $DB -c $COLL $FILE" ;;
+    esac >> "$JOBS"
 done
 
 echo ""
@@ -1,13 +1,11 @@
 #!/usr/bin/env bash
 
-JOBS=$(mktemp)
-PRG="./scripts/load_pg_one.py"
+#
+# Load the JSON with a pool of long-lived workers, each holding one
+# connection, rather than starting an interpreter per file
+#
+JOBS=${JOBS:-8}
+PRG="./scripts/load_pg.py"
 
-for FILE in json/*; do
-    echo "$PRG $FILE" >> "$JOBS"
-done
-
-NUM=$(wc -l $JOBS | awk '{print $1}')
-echo "Launching $NUM jobs"
-parallel -j 8 --halt soon,fail=1 < "$JOBS"
+$PRG --dir json --progress loaded.txt --jobs "$JOBS" "$@"
 echo "Done"
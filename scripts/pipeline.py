@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-18
+Purpose: Load XML straight into Postgres, no intermediate JSON files
+"""
+
+import argparse
+import os
+import queue
+import shadow
+import sys
+import threading
+import xml2json
+from bulk import BulkLoader
+from ct import database
+from load_pg import is_changed, load_started, record_dataload, \
+    stored_updates
+from metrics import Metrics
+from multiprocessing import Process, Queue
+from records import StudyRecord, to_record
+from serialize import dumps
+from shards import COMPRESSION, ShardWriter
+from sources import Source, find_sources, read_ids
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+# Seconds to wait on a queue before checking the other side is alive
+POLL = 1.0
+
+
+class Args(NamedTuple):
+    """ Command-line arguments """
+    files: List[Source]
+    schema: str
+    workers: int
+    writers: int
+    batch_size: int
+    queue_size: int
+    stream: bool
+    incremental: bool
+    fulltext_load: bool
+    tee: Optional[str]
+    shard_size: int
+    compress: str
+    metrics: Optional[str]
+    reload: Optional[str]
+
+
+class Parsed(NamedTuple):
+    """ A parser's result for one document """
+    name: str
+    record: Optional[StudyRecord]
+    line: Optional[bytes]
+    error: Optional[str]
+
+
+# --------------------------------------------------
+def get_args() -> Args:
+    """ Get command-line arguments """
+
+    parser = argparse.ArgumentParser(
+        description='Load XML into Postgres',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-f',
+                        '--file',
+                        help='Input XML file(s), directories or zip '
+                        'archive(s)',
+                        metavar='FILE',
+                        type=str,
+                        nargs='+',
+                        required=True)
+
+    parser.add_argument('-s',
+                        '--schema',
+                        help='XML Schema',
+                        metavar='FILE',
+                        type=argparse.FileType('rt'),
+                        required=True)
+
+    parser.add_argument('-c',
+                        '--contents',
+                        help='Only load the NCT IDs in this file, '
+                        'e.g., Contents.txt',
+                        metavar='FILE',
+                        type=str)
+
+    parser.add_argument('-w',
+                        '--workers',
+                        help='Number of parser processes',
+                        metavar='INT',
+                        type=int,
+                        default=4)
+
+    parser.add_argument('-W',
+                        '--writers',
+                        help='Number of DB writer processes',
+                        metavar='INT',
+                        type=int,
+                        default=2)
+
+    parser.add_argument('-B',
+                        '--batch-size',
+                        help='Studies per DB batch',
+                        metavar='INT',
+                        type=int,
+                        default=1000)
+
+    parser.add_argument('-q',
+                        '--queue-size',
+                        help='Parsed studies waiting to be batched',
+                        metavar='INT',
+                        type=int,
+                        default=1000)
+
+    parser.add_argument('-t',
+                        '--stream',
+                        help='Decode each document incrementally with '
+                        'iterparse',
+                        action='store_true')
+
+    parser.add_argument('-i',
+                        '--incremental',
+                        help='Only load new studies or those updated since '
+                        'their last load',
+                        action='store_true')
+
+    parser.add_argument('-n',
+                        '--no-fulltext-load',
+                        help='Only store the search vector, not the text it '
+                        'was made from',
+                        dest='fulltext_load',
+                        action='store_false')
+
+    parser.add_argument('-T',
+                        '--tee',
+                        help='Also write every study to JSONL shards in '
+                        'this directory, e.g., for Mongo',
+                        metavar='DIR',
+                        type=str)
+
+    parser.add_argument('-S',
+                        '--shard-size',
+                        help='Studies per shard with --tee',
+                        metavar='INT',
+                        type=int,
+                        default=10000)
+
+    parser.add_argument('-z',
+                        '--compress',
+                        help='Compress shards with --tee',
+                        metavar='STR',
+                        type=str,
+                        choices=list(COMPRESSION),
+                        default='none')
+
+    parser.add_argument('-M',
+                        '--metrics',
+                        help='Write stage timings and latencies as JSON',
+                        metavar='FILE',
+                        type=str)
+
+    parser.add_argument('-R',
+                        '--reload',
+                        help='Reload everything into a shadow schema built '
+                        'from this pg_dump schema, then swap it in',
+                        metavar='SQL',
+                        type=str)
+
+    args = parser.parse_args()
+
+    for name in ['workers', 'writers', 'batch_size', 'queue_size',
+                 'shard_size']:
+        if (val := getattr(args, name)) < 1:
+            flag = '--' + name.replace('_', '-')
+            parser.error(f'{flag} "{val}" must be positive')
+
+    if args.compress != 'none' and not args.tee:
+        parser.error('--compress requires --tee')
+
+    if args.reload:
+        if not os.path.isfile(args.reload):
+            parser.error(f'--reload "{args.reload}" is not a file')
+        if args.incremental:
+            parser.error('--reload loads everything, it cannot be used '
+                         'with --incremental')
+
+    if args.tee and not os.path.isdir(args.tee):
+        os.makedirs(args.tee)
+
+    include = read_ids(args.contents) if args.contents else None
+    files = find_sources(args.file, '.xml', include)
+
+    return Args(files, args.schema.name, args.workers, args.writers,
+                args.batch_size, args.queue_size, args.stream,
+                args.incremental, args.fulltext_load, args.tee,
+                args.shard_size, args.compress, args.metrics, args.reload)
+
+
+# --------------------------------------------------
+def main() -> None:
+    """ Make a jazz noise here """
+
+    args = get_args()
+    metrics = Metrics()
+    num_files = len(args.files)
+    print(f'Processing {num_files:,} file{"" if num_files == 1 else "s"}.')
+
+    stored = stored_updates() if args.incremental else None
+    plan = shadow.create(args.reload) if args.reload else None
+    started = load_started()
+
+    # Each writer opens its own connection
+    database.close()
+
+    # The queues of work are bounded, so a slow stage holds up those
+    # before it; only names and metrics come back on written
+    tasks: Any = Queue(args.queue_size)
+    parsed: Any = Queue(args.queue_size)
+    batches: Any = Queue(args.writers)
+    written: Any = Queue()
+
+    # If a stage fails, exit without waiting to flush what's queued
+    for que in [tasks, batches]:
+        que.cancel_join_thread()
+
+    # Daemons, so that they are terminated if this exits early
+    parsers = [
+        Process(target=parse,
+                args=(tasks, parsed, args.schema, args.stream,
+                      bool(args.tee)),
+                daemon=True) for _ in range(args.workers)
+    ]
+    writers = [
+        Process(target=write,
+                args=(batches, written, args.batch_size,
+                      args.fulltext_load),
+                daemon=True) for _ in range(args.writers)
+    ]
+    for proc in parsers + writers:
+        proc.start()
+
+    feeder = threading.Thread(target=feed,
+                              args=(tasks, args.files, args.workers,
+                                    parsers),
+                              daemon=True)
+    feeder.start()
+
+    shards = ShardWriter(args.tee, args.shard_size,
+                         args.compress) if args.tee else None
+    errors: List[str] = []
+    num_unchanged = num_loaded = 0
+    batch: List[Tuple[str, StudyRecord]] = []
+
+    def send(batch: List[Tuple[str, StudyRecord]]) -> None:
+        nonlocal num_loaded
+        with metrics.stage('wait writers'):
+            put(batches, batch, writers)
+        num_loaded += drain(written, metrics)
+
+    # The batcher: tee, skip unchanged and hand full batches to writers
+    num_parsers = args.workers
+    while num_parsers:
+        with metrics.stage('wait parsers'):
+            result = get(parsed, parsers)
+
+        if not isinstance(result, Parsed):
+            metrics.add(result)
+            num_parsers -= 1
+            continue
+
+        if result.error:
+            errors.append(result.error)
+            continue
+
+        if shards and result.line:
+            with metrics.stage('tee'):
+                shards.write(result.line)
+
+        if stored is not None and not is_changed(result.record, stored):
+            num_unchanged += 1
+            continue
+
+        batch.append((result.name, result.record))
+        if len(batch) == args.batch_size:
+            send(batch)
+            batch = []
+
+    if batch:
+        send(batch)
+
+    for _ in writers:
+        put(batches, None, writers)
+
+    # Writers finish with None, after which they can be joined
+    num_writers = len(writers)
+    while num_writers:
+        if (result := get(written, writers)) is None:
+            num_writers -= 1
+        else:
+            num_loaded += len(result[0])
+            metrics.add(result[1])
+
+    for proc in parsers + writers:
+        proc.join()
+
+    if shards:
+        with metrics.stage('tee'):
+            shards.close()
+
+    database.connect()
+    if plan:
+        shadow.finish(plan, metrics)
+    record_dataload(started)
+
+    if errors:
+        print('\n'.join([f'{len(errors)} ERRORS:'] + errors), file=sys.stderr)
+
+    if stored is not None:
+        print(f'{num_unchanged:,} unchanged')
+
+    print(metrics.report())
+    if args.metrics:
+        metrics.write(args.metrics)
+
+    print(f'Done, loaded {num_loaded:,}.')
+
+
+# --------------------------------------------------
+def feed(tasks: Any, files: List[Source], num_parsers: int,
+         parsers: List[Process]) -> None:
+    """ Queue the files for the parsers, then one None for each """
+
+    for file in files:
+        put(tasks, file, parsers)
+
+    for _ in range(num_parsers):
+        put(tasks, None, parsers)
+
+
+# --------------------------------------------------
+def parse(tasks: Any, parsed: Any, schema: str, stream: bool,
+          tee: bool) -> None:
+    """
+    Parser process: read, validate and restructure files into records
+    and, to tee, JSON lines. Ends by sending its metrics.
+    """
+
+    xml2json.init_worker(schema, None, stream)
+    metrics = xml2json.METRICS
+    while (file := tasks.get()) is not None:
+        metrics.mark()
+        record = line = None
+        study, error = xml2json.read_study(file)
+        if study:
+            with metrics.stage('record'):
+                record = to_record(study)
+            if tee:
+                with metrics.stage('dump'):
+                    line = dumps(study)
+
+        metrics.done()
+        with metrics.stage('wait batcher'):
+            parsed.put(Parsed(file.name, record, line, error))
+
+    parsed.put(metrics.take())
+
+
+# --------------------------------------------------
+def write(batches: Any, written: Any, batch_size: int,
+          fulltext_load: bool) -> None:
+    """
+    DB writer process: load each batch in a transaction and send back
+    its names and metrics. Ends with None.
+    """
+
+    database.connect()
+    metrics = Metrics()
+    loader = BulkLoader(batch_size, fulltext_load, metrics)
+    while (batch := batches.get()) is not None:
+        names: List[str] = []
+        for name, record in batch:
+            names.extend(loader.add(record, name))
+        names.extend(loader.flush())
+        written.put((names, metrics.take()))
+
+    written.put(None)
+    database.close()
+
+
+# --------------------------------------------------
+def put(dest: Any, item: Any, consumers: List[Process]) -> None:
+    """ Put on a bounded queue, giving up if its consumers have died """
+
+    while True:
+        try:
+            dest.put(item, timeout=POLL)
+            return
+        except queue.Full:
+            check(consumers)
+
+
+# --------------------------------------------------
+def get(source: Any, producers: List[Process]) -> Any:
+    """ Get from a queue, giving up if its producers have died """
+
+    while True:
+        try:
+            return source.get(timeout=POLL)
+        except queue.Empty:
+            check(producers)
+
+
+# --------------------------------------------------
+def check(procs: List[Process]) -> None:
+    """ Exit if a process failed """
+
+    if failed := [proc for proc in procs if proc.exitcode]:
+        sys.exit(f'{len(failed)} process(es) failed, exit code '
+                 f'{failed[0].exitcode}')
+
+
+# --------------------------------------------------
+def drain(written: Any, metrics: Metrics) -> int:
+    """ Add up what writers have sent back so far, the number loaded """
+
+    num_loaded = 0
+    while True:
+        try:
+            names, sample = written.get_nowait()
+        except queue.Empty:
+            return num_loaded
+        num_loaded += len(names)
+        metrics.add(sample)
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-18
+Purpose: Compact records of what the loaders need from each study's JSON
+"""
+
+import datetime as dt
+from dates import parse_date
+from sys import intern
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+OUTCOME_TYPES = ['primary_outcomes', 'secondary_outcomes', 'other_outcomes']
+
+# Width of the varchar(255) columns, longer values are cut to fit
+MAX_NAME = 255
+
+
+class Doc(NamedTuple):
+    """ A study document """
+    doc_id: str
+    doc_type: str
+    doc_url: str
+    doc_comment: str
+
+
+class Outcome(NamedTuple):
+    """ A primary, secondary or other outcome """
+    outcome_type: str
+    measure: str
+    time_frame: str
+    description: str
+
+
+class ArmGroup(NamedTuple):
+    """ A study arm or group """
+    arm_group_label: str
+    arm_group_type: str
+    description: str
+
+
+class Design(NamedTuple):
+    """ A study's design """
+    allocation: str
+    intervention_model: str
+    intervention_model_description: str
+    primary_purpose: str
+    observational_model: str
+    time_perspective: str
+    masking: str
+    masking_description: str
+
+
+class Eligibility(NamedTuple):
+    """ Who can take part in a study """
+    study_pop: str
+    sampling_method: str
+    criteria: str
+    gender: str
+    gender_based: str
+    gender_description: str
+    minimum_age: str
+    maximum_age: str
+    healthy_volunteers: str
+
+
+class Location(NamedTuple):
+    """ A study site """
+    facility_name: str
+    status: str
+    contact_name: str
+    investigator_name: str
+
+
+class StudyRecord(NamedTuple):
+    """ A study as the loaders use it """
+    nct_id: str
+    phase: str
+    study_type: str
+    overall_status: str
+    last_known_status: str
+    brief_title: str
+    official_title: str
+    org_study_id: str
+    acronym: str
+    source: str
+    rank: str
+    brief_summary: str
+    detailed_description: str
+    why_stopped: str
+    has_expanded_access: str
+    target_duration: str
+    biospec_retention: str
+    biospec_description: str
+    keywords: str
+    enrollment: Optional[int]
+    start_date: Optional[dt.date]
+    completion_date: Optional[dt.date]
+    verification_date: Optional[dt.date]
+    primary_completion_date: Optional[dt.date]
+    study_first_submitted: Optional[dt.date]
+    study_first_submitted_qc: Optional[dt.date]
+    study_first_posted: Optional[dt.date]
+    results_first_submitted: Optional[dt.date]
+    results_first_submitted_qc: Optional[dt.date]
+    results_first_posted: Optional[dt.date]
+    disposition_first_submitted: Optional[dt.date]
+    disposition_first_submitted_qc: Optional[dt.date]
+    disposition_first_posted: Optional[dt.date]
+    last_update_submitted: Optional[dt.date]
+    last_update_submitted_qc: Optional[dt.date]
+    last_update_posted: Optional[dt.date]
+    text: str
+    conditions: Tuple[str, ...]
+    sponsors: Tuple[str, ...]
+    interventions: Tuple[str, ...]
+    docs: Tuple[Doc, ...]
+    outcomes: Tuple[Outcome, ...]
+    arm_groups: Tuple[ArmGroup, ...]
+    design: Optional[Design]
+    eligibility: Optional[Eligibility]
+    locations: Tuple[Location, ...]
+    urls: Tuple[str, ...]
+
+
+# --------------------------------------------------
+def to_record(data: Dict[str, Any]) -> StudyRecord:
+    """
+    Record for a study's JSON. Names that repeat across studies, e.g.,
+    statuses and conditions, are interned and dates are parsed (and
+    cached), so a batch shares one copy of each.
+    """
+
+    return StudyRecord(
+        nct_id=data['nct_id'],
+        phase=intern(data['phase'] or 'N/A'),
+        study_type=intern(data['study_type'] or 'N/A'),
+        overall_status=intern(data['overall_status'] or 'N/A'),
+        last_known_status=intern(data['last_known_status'] or 'N/A'),
+        brief_title=data['brief_title'],
+        official_title=data['official_title'],
+        org_study_id=data['org_study_id'],
+        acronym=data['acronym'],
+        source=intern(data['source']),
+        rank=data['rank'],
+        brief_summary=data['brief_summary'],
+        detailed_description=data['detailed_description'],
+        why_stopped=data['why_stopped'],
+        has_expanded_access=intern(data['has_expanded_access']),
+        target_duration=data['target_duration'],
+        biospec_retention=intern(data['biospec_retention']),
+        biospec_description=data['biospec_description'],
+        keywords=', '.join(data['keywords']),
+        enrollment=(data.get('enrollment') or {}).get('value'),
+        start_date=parse_date(data['start_date']),
+        completion_date=parse_date(data['completion_date']),
+        verification_date=parse_date(data['verification_date']),
+        primary_completion_date=parse_date(data['primary_completion_date']),
+        study_first_submitted=parse_date(data['study_first_submitted']),
+        study_first_submitted_qc=parse_date(
+            data['study_first_submitted_qc']),
+        study_first_posted=parse_date(data['study_first_posted']),
+        results_first_submitted=parse_date(data['results_first_submitted']),
+        results_first_submitted_qc=parse_date(
+            data['results_first_submitted_qc']),
+        results_first_posted=parse_date(data['results_first_posted']),
+        disposition_first_submitted=parse_date(
+            data['disposition_first_submitted']),
+        disposition_first_submitted_qc=parse_date(
+            data['disposition_first_submitted_qc']),
+        disposition_first_posted=parse_date(
+            data['disposition_first_posted']),
+        last_update_submitted=parse_date(data['last_update_submitted']),
+        last_update_submitted_qc=parse_date(
+            data['last_update_submitted_qc']),
+        last_update_posted=parse_date(data['last_update_posted']),
+        text=data['text'],
+        conditions=tuple(map(intern, data.get('conditions') or [])),
+        sponsors=tuple(map(intern, data.get('sponsors') or [])),
+        interventions=tuple(
+            intern(intervention['intervention_name'])
+            for intervention in data.get('interventions') or []),
+        docs=tuple(
+            Doc(doc_id=doc['doc_id'],
+                doc_type=intern(doc['doc_type']),
+                doc_url=doc['doc_url'],
+                doc_comment=doc['doc_comment'])
+            for doc in data.get('study_docs') or []),
+        outcomes=tuple(
+            Outcome(outcome_type=intern(outcome_type.replace('_outcomes', '')),
+                    measure=outcome['measure'],
+                    time_frame=intern(outcome['time_frame']),
+                    description=outcome['description'])
+            for outcome_type in OUTCOME_TYPES
+            for outcome in data.get(outcome_type) or []),
+        arm_groups=tuple(
+            ArmGroup(arm_group_label=group['arm_group_label'][:MAX_NAME],
+                     arm_group_type=intern(group['arm_group_type']),
+                     description=group['description'])
+            for group in data.get('arm_groups') or []),
+        design=Design(
+            **data['study_design']) if data.get('study_design') else None,
+        eligibility=Eligibility(
+            **data['eligibility']) if data.get('eligibility') else None,
+        locations=tuple(
+            Location(facility_name=loc['facility_name'][:MAX_NAME],
+                     status=intern(loc['status']),
+                     contact_name=loc['contact_name'],
+                     investigator_name=loc['investigator_name'])
+            for loc in data.get('locations') or []),
+        urls=tuple(link['url'] for link in data.get('links') or []))
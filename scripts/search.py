@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-18
+Purpose: Compile saved searches to prepared SQL with keyset pagination
+"""
+
+import argparse
+import hashlib
+import re
+from ct import database, SavedSearch
+from typing import Any, List, NamedTuple, Optional, Set, Tuple
+
+# Study columns returned for each hit
+COLUMNS = ['study_id', 'nct_id', 'brief_title']
+
+# Linked name tables: field -> (link table, name table, key, name column).
+# The tsvector expressions match the GIN indexes on condition_name and
+# sponsor_name so that the planner can use them.
+LINKS = {
+    'conditions': ('study_to_condition', 'condition', 'condition_id',
+                   'condition_name'),
+    'sponsors': ('study_to_sponsor', 'sponsor', 'sponsor_id',
+                 'sponsor_name'),
+    'interventions': ('study_to_intervention', 'intervention',
+                      'intervention_id', 'intervention_name'),
+}
+
+# A *_bool flag of 1 requires every term, 0 any of them
+MATCH_ALL = 1
+
+# Letters and digits, accented or not, as the tsvectors keep them
+WORD = re.compile(r'[^\W_]+')
+
+
+class Query(NamedTuple):
+    """ The search fields of a SavedSearch """
+    full_text: str = ''
+    full_text_bool: int = 0
+    conditions: str = ''
+    conditions_bool: int = 0
+    sponsors: str = ''
+    sponsors_bool: int = 0
+    interventions: str = ''
+    interventions_bool: int = 0
+    phase_ids: str = ''
+    study_type_ids: str = ''
+    enrollment: int = 0
+
+
+class Compiled(NamedTuple):
+    """ A query's prepared statement and its arguments """
+    name: str
+    sql: str
+    types: List[str]
+    params: List[Any]
+
+
+class Page(NamedTuple):
+    """ One page of hits and the key to fetch the next from """
+    studies: List[Tuple]
+    next_after: Optional[str]
+
+
+class Args(NamedTuple):
+    """ Command-line arguments """
+    query: Query
+    after: str
+    limit: int
+
+
+# --------------------------------------------------
+def get_args() -> Args:
+    """ Get command-line arguments """
+
+    parser = argparse.ArgumentParser(
+        description='Search studies',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-S',
+                        '--saved-search',
+                        help='Run a saved search by ID',
+                        metavar='INT',
+                        type=int)
+
+    parser.add_argument('-t',
+                        '--text',
+                        help='Full-text terms, comma-separated',
+                        metavar='STR',
+                        type=str,
+                        default='')
+
+    parser.add_argument('-c',
+                        '--conditions',
+                        help='Condition terms, comma-separated',
+                        metavar='STR',
+                        type=str,
+                        default='')
+
+    parser.add_argument('-s',
+                        '--sponsors',
+                        help='Sponsor terms, comma-separated',
+                        metavar='STR',
+                        type=str,
+                        default='')
+
+    parser.add_argument('-i',
+                        '--interventions',
+                        help='Intervention terms, comma-separated',
+                        metavar='STR',
+                        type=str,
+                        default='')
+
+    parser.add_argument('-A',
+                        '--all',
+                        help='Require all terms of each field, not any',
+                        action='store_true')
+
+    parser.add_argument('-a',
+                        '--after',
+                        help='Return studies after this NCT ID',
+                        metavar='STR',
+                        type=str,
+                        default='')
+
+    parser.add_argument('-l',
+                        '--limit',
+                        help='Studies per page',
+                        metavar='INT',
+                        type=int,
+                        default=50)
+
+    args = parser.parse_args()
+
+    if args.limit < 1:
+        parser.error(f'--limit "{args.limit}" must be positive')
+
+    if args.saved_search:
+        query = to_query(SavedSearch.get_by_id(args.saved_search))
+    else:
+        match = MATCH_ALL if args.all else 0
+        query = Query(full_text=args.text,
+                      full_text_bool=match,
+                      conditions=args.conditions,
+                      conditions_bool=match,
+                      sponsors=args.sponsors,
+                      sponsors_bool=match,
+                      interventions=args.interventions,
+                      interventions_bool=match)
+
+    return Args(query, args.after, args.limit)
+
+
+# --------------------------------------------------
+def main() -> None:
+    """ Make a jazz noise here """
+
+    args = get_args()
+    page = Searcher().search(args.query, args.after, args.limit)
+
+    for _, nct_id, title in page.studies:
+        print(f'{nct_id}\t{title}')
+
+    if page.next_after:
+        print(f'Next page: --after {page.next_after}')
+
+
+# --------------------------------------------------
+class Searcher:
+    """ Run queries as statements prepared once per connection """
+    def __init__(self) -> None:
+        self.connection: Any = None
+        self.prepared: Set[str] = set()
+
+    def search(self, query: Query, after: str = '', limit: int = 50) -> Page:
+        """ The page of studies after the NCT ID that match the query """
+
+        compiled = compile_query(query)
+        studies = self.execute(compiled, [after, limit])
+        next_after = studies[-1][1] if len(studies) == limit else None
+        return Page(studies, next_after)
+
+    def execute(self, compiled: Compiled, page: List[Any]) -> List[Tuple]:
+        """ EXECUTE the statement, PREPAREing it first if needed """
+
+        # Prepared statements belong to the session, which another
+        # Searcher may have used already
+        cursor = database.cursor()
+        if self.connection is not database.connection():
+            self.connection = database.connection()
+            cursor.execute('SELECT name FROM pg_prepared_statements')
+            self.prepared = {name for name, in cursor.fetchall()}
+
+        if compiled.name not in self.prepared:
+            cursor.execute(f'PREPARE {compiled.name} '
+                           f'({", ".join(compiled.types)}) AS {compiled.sql}')
+            self.prepared.add(compiled.name)
+
+        params = page + compiled.params
+        cursor.execute(
+            f'EXECUTE {compiled.name} ({", ".join(["%s"] * len(params))})',
+            params)
+        return cursor.fetchall()
+
+
+# --------------------------------------------------
+def to_query(search: SavedSearch) -> Query:
+    """ Query from a saved search """
+
+    return Query(**{fld: getattr(search, fld) for fld in Query._fields})
+
+
+# --------------------------------------------------
+def compile_query(query: Query) -> Compiled:
+    """
+    One statement for the query. $1 and $2 are always the NCT ID to
+    page after and the page size; the rest follow from the query's
+    shape, i.e., which fields are used and, when all terms are
+    required, how many, but not the terms themselves.
+    """
+
+    types = ['text', 'int']
+    params: List[Any] = []
+    where = ['s.nct_id > $1']
+
+    def param(typ: str, val: Any) -> str:
+        types.append(typ)
+        params.append(val)
+        return f'${len(types)}'
+
+    if terms := tsquery_terms(query.full_text):
+        tsquery = combine(terms, query.full_text_bool == MATCH_ALL)
+        where.append("s.fulltext @@ to_tsquery('english', "
+                     f"{param('text', tsquery)})")
+
+    for fld, (link, table, key, name) in LINKS.items():
+        if not (terms := tsquery_terms(getattr(query, fld))):
+            continue
+
+        # All terms may match different names, so one EXISTS per term
+        groups = [[term] for term in terms] if getattr(
+            query, fld + '_bool') == MATCH_ALL else [terms]
+        for group in groups:
+            where.append(
+                f'EXISTS (SELECT 1 FROM {link} x '
+                f'JOIN {table} n ON n.{key} = x.{key} '
+                f'WHERE x.study_id = s.study_id '
+                f"AND to_tsvector('english', n.{name}) @@ "
+                f"to_tsquery('english', {param('text', combine(group))}))")
+
+    if phase_ids := to_ids(query.phase_ids):
+        where.append(f's.phase_id = ANY({param("int[]", phase_ids)})')
+
+    if study_type_ids := to_ids(query.study_type_ids):
+        where.append(
+            f's.study_type_id = ANY({param("int[]", study_type_ids)})')
+
+    if query.enrollment:
+        where.append(f's.enrollment >= {param("int", query.enrollment)}')
+
+    sql = (f'SELECT {", ".join("s." + col for col in COLUMNS)} '
+           f'FROM study s WHERE {" AND ".join(where)} '
+           'ORDER BY s.nct_id LIMIT $2')
+    name = 'search_' + hashlib.md5(sql.encode()).hexdigest()[:16]
+
+    return Compiled(name, sql, types, params)
+
+
+# --------------------------------------------------
+def tsquery_terms(text: str) -> List[str]:
+    """
+    Comma-separated terms as tsquery text, each requiring all of its
+    words. Only letters and digits are kept, so no operators get in.
+
+    >>> tsquery_terms('Sjögren syndrome, Behçet | !x')
+    ['sjögren & syndrome', 'behçet & x']
+    """
+
+    terms = []
+    for term in text.split(','):
+        if words := WORD.findall(term.lower()):
+            terms.append(' & '.join(words))
+
+    return terms
+
+
+# --------------------------------------------------
+def combine(terms: List[str], match_all: bool = False) -> str:
+    """ Join tsquery terms requiring all or any of them """
+
+    return (' & ' if match_all else ' | ').join(f'({term})'
+                                                for term in terms)
+
+
+# --------------------------------------------------
+def to_ids(text: str) -> List[int]:
+    """ IDs from a list like "1,3" """
+
+    return list(map(int, re.findall(r'\d+', text or '')))
+
+
+# --------------------------------------------------
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-18
+Purpose: JSON encoding/decoding with orjson if it's installed
+"""
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# --------------------------------------------------
+def dumps(obj: Any, indent: bool = False) -> bytes:
+    """
+    UTF-8 JSON, compact or indented by two spaces. orjson and json give
+    the same bytes for studies (str keys, no floats).
+    """
+
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode()
+
+    return json.dumps(obj, separators=(',', ':'),
+                      ensure_ascii=False).encode()
+
+
+# --------------------------------------------------
+def loads(data: Union[bytes, str]) -> Any:
+    """ Decode JSON """
+
+    return orjson.loads(data) if orjson else json.loads(data)
@@ -0,0 +1,161 @@
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-18
+Purpose: Reload into a shadow schema, then swap it in for the live tables
+"""
+
+import re
+from ct import database
+from metrics import Metrics
+from typing import List, NamedTuple, Optional
+
+# Where the reload is built, and where the live tables go once replaced
+SHADOW = 'shadow'
+RETIRED = 'retired'
+
+# Tables that aren't reloaded but kept as they are, e.g., the users
+KEPT = ['web_user', 'saved_search', 'dataload']
+
+# Lookups copied from the live tables with their IDs, which saved
+# searches refer to, before the load adds any new names
+SEEDED = ['phase', 'study_type', 'status', 'condition', 'sponsor',
+          'intervention']
+
+# Indexes built during the load as the merges look rows up by them
+LOAD_INDEX = re.compile(r'USING btree \(study_id\b')
+
+# Don't hold up searches for long waiting to swap
+LOCK_TIMEOUT = '10s'
+
+# Memory for each index build
+MAINTENANCE_WORK_MEM = '512MB'
+
+
+class Plan(NamedTuple):
+    """ A pg_dump schema's statements for the reloaded tables """
+    tables: List[str]
+    create: List[str]
+    finish: List[str]
+
+
+# --------------------------------------------------
+def read_plan(filename: str) -> Plan:
+    """
+    The statements of a pg_dump schema for the shadow schema's tables,
+    those to create it before the load and those deferred until after:
+    the foreign keys and the indexes the load doesn't use
+    """
+
+    with open(filename, 'rt') as fh:
+        dump = fh.read()
+
+    kept = re.compile(r'public\.(?:{})'.format('|'.join(KEPT)))
+    tables: List[str] = []
+    plan = Plan(tables, [], [])
+
+    # pg_dump heads each object with "-- Name: ...; Type: ...; ..."
+    parts = re.split(r'^-- Name: [^;]+; Type: ([^;]+);.*$', dump, flags=re.M)
+    for kind, body in zip(parts[1::2], parts[2::2]):
+        text = '\n'.join(line for line in body.splitlines()
+                         if not line.startswith('--'))
+        for sql in filter(None, map(str.strip, text.split(';\n'))):
+            if 'public.' not in sql or kept.search(sql):
+                continue
+
+            sql = sql.rstrip(';').replace('public.', f'{SHADOW}.')
+            if kind == 'TABLE' and sql.startswith('CREATE TABLE'):
+                tables.append(sql.split()[2].split('.')[1])
+
+            deferred = kind == 'FK CONSTRAINT' or (
+                kind == 'INDEX' and not LOAD_INDEX.search(sql))
+            (plan.finish if deferred else plan.create).append(sql)
+
+    return plan
+
+
+# --------------------------------------------------
+def create(filename: str) -> Plan:
+    """
+    Build the shadow schema, its lookups seeded from the live ones, and
+    point new connections at it, the kept tables still found in public
+    """
+
+    plan = read_plan(filename)
+    with database.atomic():
+        cursor = database.cursor()
+        cursor.execute(f'DROP SCHEMA IF EXISTS {SHADOW} CASCADE')
+        cursor.execute(f'CREATE SCHEMA {SHADOW}')
+        for sql in plan.create:
+            cursor.execute(sql)
+        for table in filter(is_live, SEEDED):
+            cursor.execute(f'INSERT INTO {SHADOW}.{table} '
+                           f'SELECT * FROM public.{table}')
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence('{SHADOW}.{table}', "
+                f"'{table}_id'), MAX({table}_id)) FROM {SHADOW}.{table} "
+                f"HAVING COUNT(*) > 0")
+
+    database.close()
+    database.connect_params['options'] = f'-c search_path={SHADOW},public'
+    print(f'Reloading {len(plan.tables)} tables into "{SHADOW}"')
+
+    return plan
+
+
+# --------------------------------------------------
+def finish(plan: Plan, metrics: Optional[Metrics] = None) -> None:
+    """
+    Keep the load times of unchanged studies, build the deferred indexes
+    and foreign keys, analyze, then swap the shadow tables in for the
+    live ones in one transaction
+    """
+
+    metrics = metrics or Metrics()
+    cursor = database.cursor()
+
+    # Studies not updated since they were last loaded keep that time, as
+    # the incremental loads would, so alerts only see the changed ones
+    if is_live('study'):
+        with metrics.stage('shadow timestamps'), database.atomic():
+            cursor.execute(f"""
+                UPDATE {SHADOW}.study s
+                SET    record_last_updated = p.record_last_updated
+                FROM   public.study p
+                WHERE  p.nct_id = s.nct_id
+                AND    s.last_update_posted <= p.last_update_posted
+                """)
+
+    with metrics.stage('shadow indexes'), database.atomic():
+        cursor.execute(
+            f"SET LOCAL maintenance_work_mem = '{MAINTENANCE_WORK_MEM}'")
+        for sql in plan.finish:
+            cursor.execute(sql)
+
+    with metrics.stage('shadow analyze'):
+        for table in plan.tables:
+            cursor.execute(f'ANALYZE {SHADOW}.{table}')
+
+    # Readers wait on the locks, then see all the new tables at once
+    with metrics.stage('shadow swap'), database.atomic():
+        cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+        cursor.execute(f'DROP SCHEMA IF EXISTS {RETIRED} CASCADE')
+        cursor.execute(f'CREATE SCHEMA {RETIRED}')
+        for table in plan.tables:
+            cursor.execute(
+                f'ALTER TABLE IF EXISTS public.{table} SET SCHEMA {RETIRED}')
+        for table in plan.tables:
+            cursor.execute(f'ALTER TABLE {SHADOW}.{table} SET SCHEMA public')
+        cursor.execute(f'DROP SCHEMA {SHADOW}')
+
+    with metrics.stage('shadow drop'):
+        cursor.execute(f'DROP SCHEMA {RETIRED} CASCADE')
+
+    print(f'Swapped in {len(plan.tables)} tables')
+
+
+# --------------------------------------------------
+def is_live(table: str) -> bool:
+    """ Whether public has the table, e.g., not before the first load """
+
+    sql = 'SELECT to_regclass(%s) IS NOT NULL'
+    return database.execute_sql(sql, [f'public.{table}']).fetchone()[0]
@@ -0,0 +1,138 @@
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-18
+Purpose: Read and write studies as JSON lines (JSONL) shards
+"""
+
+import gzip
+import io
+import os
+from serialize import loads
+from sources import Source
+from typing import AbstractSet, Any, BinaryIO, Dict, Iterator, Optional, \
+    Tuple
+
+# --compress choice -> shard file extension
+COMPRESSION = {'none': '.jsonl', 'gzip': '.jsonl.gz', 'zstd': '.jsonl.zst'}
+
+# Suffixes to find shards among other inputs
+SHARD_SUFFIXES = tuple(COMPRESSION.values())
+
+
+# --------------------------------------------------
+def is_shard(name: str) -> bool:
+    """ Whether the file name looks like a JSONL shard """
+
+    return name.endswith(SHARD_SUFFIXES)
+
+
+# --------------------------------------------------
+def zstandard_module() -> Any:
+    """ Import the optional zstandard module """
+
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('Install "zstandard" to use zstd shards')
+
+    return zstandard
+
+
+# --------------------------------------------------
+class ShardWriter:
+    """ Write JSON lines to numbered shards of at most shard_size lines """
+    def __init__(self, outdir: str, shard_size: int,
+                 compress: str = 'none') -> None:
+        self.outdir = outdir
+        self.shard_size = shard_size
+        self.ext = COMPRESSION[compress]
+        self.compress = compress
+        self.num_shards = 0
+        self.num_lines = 0
+        self.fh: Optional[BinaryIO] = None
+
+    def write(self, line: bytes) -> None:
+        """ Write one line, starting a new shard when the current is full """
+
+        if self.fh is None or self.num_lines == self.shard_size:
+            self.close()
+            self.fh = self.open_next()
+
+        self.fh.write(line + b'\n')
+        self.num_lines += 1
+
+    def open_next(self) -> BinaryIO:
+        """ Open the next numbered shard """
+
+        path = os.path.join(self.outdir,
+                            f'studies-{self.num_shards:05d}{self.ext}')
+        self.num_shards += 1
+        self.num_lines = 0
+
+        if self.compress == 'gzip':
+            return gzip.open(path, 'wb', compresslevel=6)
+
+        if self.compress == 'zstd':
+            return zstandard_module().ZstdCompressor().stream_writer(
+                open(path, 'wb'))
+
+        return open(path, 'wb')
+
+    def close(self) -> None:
+        """ Finish the current shard """
+
+        if self.fh:
+            self.fh.close()
+            self.fh = None
+
+    def __enter__(self) -> 'ShardWriter':
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+# --------------------------------------------------
+def read_shard(file: Source) -> Iterator[Dict[str, Any]]:
+    """ Each study in a shard, which may be inside a zip archive """
+
+    with file.open() as raw:
+        fh: BinaryIO = raw
+        if file.name.endswith('.gz'):
+            fh = gzip.GzipFile(fileobj=raw)
+        elif file.name.endswith('.zst'):
+            fh = io.BufferedReader(
+                zstandard_module().ZstdDecompressor().stream_reader(raw))
+
+        for line in fh:
+            if line.strip():
+                yield loads(line)
+
+
+# --------------------------------------------------
+def read_studies(
+    file: Source,
+    done: AbstractSet[str] = frozenset()
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    The progress name and data of each study in a JSON file or JSONL shard
+    that isn't done. Shard studies are named "NCT....json" as if they had
+    been written to their own files.
+    """
+
+    if not is_shard(file.name):
+        if file.name not in done:
+            yield file.name, read_json(file)
+        return
+
+    for data in read_shard(file):
+        if (name := data['nct_id'] + '.json') not in done:
+            yield name, data
+
+
+# --------------------------------------------------
+def read_json(file: Source) -> Dict[str, Any]:
+    """ Read a study's JSON """
+
+    with file.open() as fh:
+        return loads(fh.read())
@@ -0,0 +1,86 @@
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-18
+Purpose: Find input documents on disk or inside zip archives
+"""
+
+import os
+import re
+import zipfile
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, List, NamedTuple, Optional, \
+    Set, Tuple, Union
+
+# Archives opened for reading, per process so workers never share a handle
+ARCHIVES: Dict[str, zipfile.ZipFile] = {}
+
+NCT_ID = re.compile(r'NCT\d{8}')
+
+
+# --------------------------------------------------
+class Source(NamedTuple):
+    """ A document on disk or, if member is set, inside a zip archive """
+    path: str
+    member: str = ''
+
+    @property
+    def name(self) -> str:
+        """ The document's file name """
+
+        return os.path.basename(self.member or self.path)
+
+    def open(self) -> BinaryIO:
+        """ Open the document to read bytes """
+
+        if not self.member:
+            return open(self.path, 'rb')
+
+        if (archive := ARCHIVES.get(self.path)) is None:
+            archive = ARCHIVES[self.path] = zipfile.ZipFile(self.path)
+
+        return archive.open(self.member)
+
+    def __str__(self) -> str:
+        return f'{self.path}:{self.member}' if self.member else self.path
+
+
+# --------------------------------------------------
+def find_sources(names: Iterable[str],
+                 suffix: Union[str, Tuple[str, ...]],
+                 include: Optional[Set[str]] = None) -> List[Source]:
+    """
+    Expand files, directories and zip archives into the documents ending
+    with the suffix (or any of the suffixes), keeping only the NCT IDs in
+    include if given
+    """
+
+    suffixes = (suffix, ) if isinstance(suffix, str) else suffix
+    sources: List[Source] = []
+    for name in map(str, names):
+        if os.path.isdir(name):
+            for ext in suffixes:
+                sources.extend(
+                    Source(str(path)) for path in Path(name).rglob('*' + ext))
+        elif name.endswith('.zip'):
+            with zipfile.ZipFile(name) as archive:
+                sources.extend(
+                    Source(name, member) for member in archive.namelist()
+                    if member.endswith(suffixes))
+        else:
+            sources.append(Source(name))
+
+    if include is not None:
+        sources = [
+            source for source in sources
+            if (match := NCT_ID.search(source.name)) and match[0] in include
+        ]
+
+    return sources
+
+
+# --------------------------------------------------
+def read_ids(filename: str) -> Set[str]:
+    """ All the NCT IDs mentioned in a file, e.g., Contents.txt """
+
+    with open(filename, 'rt') as fh:
+        return set(NCT_ID.findall(fh.read()))
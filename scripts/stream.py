@@ -0,0 +1,114 @@
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-18
+Purpose: Decode a study with iterparse, one top-level element at a time
+"""
+
+import xmlschema
+from tokenizer import tokenize
+from xml.etree.ElementTree import iterparse
+from typing import Any, BinaryIO, Dict, Iterable, List, Set, Tuple
+
+
+# --------------------------------------------------
+def extract(source: BinaryIO,
+            schema: xmlschema.XMLSchema) -> Tuple[Dict[str, Any], Set[str],
+                                                  List[Any]]:
+    """
+    Decode the children of the document's root as each one ends, the
+    same as schema.to_dict() would, gathering the search tokens from
+    the text and attributes of every element below the root.
+    Each child is cleared once decoded, so only one is ever in memory,
+    and the order and number of the children are checked against the
+    root's content model as they end.
+    Returns the data, the distinct tokens and any validation errors.
+    """
+
+    data: Dict[str, Any] = {}
+    words: Set[str] = set()
+    errors: List[Any] = []
+    texts: List[str] = []
+    root = xsd_root = model = None
+    depth = 0
+
+    for event, elem in iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+                if (xsd_root := schema.elements.get(elem.tag)) is None:
+                    errors.append(f'Unknown root element "{elem.tag}"')
+                    return data, words, errors
+                model = xsd_root.type.content.get_model_visitor()
+            depth += 1
+            continue
+
+        depth -= 1
+        if depth == 0:
+            if not errors:
+                errors.extend(model_errors(model.stop()))
+            break
+
+        if text := elem.text:
+            if text := text.strip():
+                texts.append(text)
+        texts.extend(elem.attrib.values())
+
+        if depth > 1:
+            continue
+
+        # A child of the root is complete, so check and decode it and let
+        # it go. After an error the document is invalid anyway, and a
+        # broken model can't check the children that follow.
+        if not errors:
+            errors.extend(advance(model, elem.tag))
+
+        if (xsd_child := xsd_root.find(elem.tag)) is None:
+            errors.append(f'Unexpected element "{elem.tag}"')
+        else:
+            value, child_errors = xsd_child.decode(elem, validation='lax')
+            errors.extend(child_errors)
+            if xsd_child.is_single():
+                data[elem.tag] = value
+            else:
+                data.setdefault(elem.tag, []).append(value)
+
+        words.update(tokenize(texts))
+        texts = []
+        elem.clear()
+        del root[-1]
+
+    return data, words, errors
+
+
+# --------------------------------------------------
+def advance(model: Any, tag: str) -> List[str]:
+    """
+    Move the root's content model past the next child, as decoding the
+    whole tree would, giving any errors
+    """
+
+    while model.element is not None:
+        if model.match_element(tag) is None:
+            # Skip optional particles, erring if one was required
+            if errors := model_errors(model.advance(False)):
+                return [f'Unexpected element "{tag}": {err}' for err in errors]
+            continue
+
+        return model_errors(model.advance(True))
+
+    return [f'Unexpected element "{tag}"']
+
+
+# --------------------------------------------------
+def model_errors(violations: Iterable[Tuple[Any, int, Any]]) -> List[str]:
+    """ Errors for the particles whose occurrences a model found wrong """
+
+    errors = []
+    for particle, occurs, _ in violations:
+        name = getattr(particle, 'local_name', None) or 'group'
+        if occurs < particle.min_occurs:
+            errors.append(f'Missing element "{name}"')
+        else:
+            errors.append(f'Too many "{name}" elements')
+
+    return errors
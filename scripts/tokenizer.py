@@ -0,0 +1,39 @@
+"""
+Author : Ken Youens-Clark <kyclark@gmail.com>
+Date   : 2026-10-18
+Purpose: Tokenize study text for the search "text" field
+"""
+
+import re
+from typing import FrozenSet, Iterable, List
+
+# Words too common to be worth indexing
+STOPWORDS: FrozenSet[str] = frozenset(['an', 'the', 'and'])
+
+# Joins tokens so one regex pass cleans the whole document
+SEP = '\n'
+
+# Runs of underscores/hyphens inside a token become a space
+DASHES = re.compile('[_-]+')
+
+# Anything but letters, digits, periods and whitespace is dropped
+JUNK = re.compile(r'[^a-zA-Z0-9.\s]')
+
+# Bare numbers like "12", "-3.5" or "1.2.3"
+NUMBER = re.compile(r'-?[\d.]+')
+
+
+# --------------------------------------------------
+def tokenize(texts: Iterable[str],
+             stopwords: FrozenSet[str] = STOPWORDS) -> List[str]:
+    """ Return the words from all the texts, in order """
+
+    # Whitespace-split the whole document at once, then clean all the
+    # tokens together; SEP never occurs inside a token so they split back
+    tokens = SEP.join(texts).lower().split()
+    cleaned = JUNK.sub('', DASHES.sub(' ', SEP.join(tokens))).split(SEP)
+
+    return [
+        word for word in cleaned if len(word) > 1 and word not in stopwords
+        and not NUMBER.fullmatch(word)
+    ]
@@ -1 +1,3 @@
-update study set fulltext=to_tsvector('english', fulltext_load);
+-- Backfill the search vector for studies loaded before the loaders set it
+update study set fulltext=to_tsvector('english', fulltext_load)
+where fulltext is null and fulltext_load is not null;
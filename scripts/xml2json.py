@@ -6,30 +6,67 @@ Purpose: Rock the Casbah
 """
 
 import argparse
-import dateparser
-import datetime as dt
-import json
+import io
 # import namedtupled
 import os
 import re
 import sys
-import typedload
 import xmlschema
 import xmltodict
 from rich.progress import track
-from itertools import chain
 from functools import partial
+from multiprocessing import Pool
 from pprint import pprint
-from xml.etree.ElementTree import ElementTree
-from pathlib import Path
-from typing import Dict, List, NamedTuple, TypedDict, Tuple, Any, TextIO, Optional
+from xml.etree.ElementTree import Element, ElementTree, ParseError
+from dates import parse_date
+from manifest import Entries, Manifest, content_hash
+from metrics import Metrics, Sample
+from serialize import dumps
+from shards import COMPRESSION, ShardWriter
+from sources import Source, find_sources, read_ids
+from stream import extract
+from tokenizer import tokenize
+from typing import Dict, Iterator, List, NamedTuple, TypedDict, Tuple, Any, \
+    TextIO, Optional
+
+# Files handed to each worker at a time with --workers
+CHUNK_SIZE = 64
+
+# Converted files between manifest updates
+MANIFEST_BATCH = 1000
+
+# Set per process by init_worker()
+SCHEMA: Optional[xmlschema.XMLSchema] = None
+KNOWN: Optional[Entries] = None
+STREAM = False
+
+# Stage times of this process, handed back with each result
+METRICS = Metrics()
 
 
 class Args(NamedTuple):
     """ Command-line arguments """
-    files: List[str]
+    files: List[Source]
     outdir: str
     schema: TextIO
+    workers: int
+    jsonl: bool
+    shard_size: int
+    compress: str
+    manifest: Optional[str]
+    force: bool
+    stream: bool
+    metrics: Optional[str]
+
+
+class Converted(NamedTuple):
+    """ Outcome of converting one XML file to its own JSON file """
+    name: str
+    out_file: str
+    digest: str = ''
+    error: Optional[str] = None
+    skipped: bool = False
+    sample: Optional[Sample] = None
 
 
 class OversightInfo(TypedDict):
@@ -101,6 +138,20 @@ class ArmGroup(TypedDict):
     description: str
 
 
+class Location(TypedDict):
+    """ Location """
+    facility_name: str
+    status: str
+    contact_name: str
+    investigator_name: str
+
+
+class Link(TypedDict):
+    """ Link """
+    url: str
+    description: str
+
+
 class StudyDoc(TypedDict):
     """ StudyDoc """
     doc_id: str
@@ -198,6 +249,8 @@ class Study(TypedDict):
     secondary_outcomes: List[ProtocolOutcome]
     other_outcomes: List[ProtocolOutcome]
     arm_groups: List[ArmGroup]
+    locations: List[Location]
+    links: List[Link]
     interventions: List[Intervention]
     interventions: List[Intervention]
     overall_official: List[Investigator]
@@ -226,7 +279,7 @@ def get_args() -> Args:
 
     parser.add_argument('-f',
                         '--file',
-                        help='Input XML file(s)',
+                        help='Input XML file(s) or zip archive(s)',
                         metavar='FILE',
                         type=str,
                         nargs='+')
@@ -252,24 +305,90 @@ def get_args() -> Args:
                         type=argparse.FileType('rt'),
                         required=True)
 
+    parser.add_argument('-w',
+                        '--workers',
+                        help='Number of worker processes',
+                        metavar='INT',
+                        type=int,
+                        default=1)
+
+    parser.add_argument('-c',
+                        '--contents',
+                        help='Only convert the NCT IDs in this file, '
+                        'e.g., Contents.txt',
+                        metavar='FILE',
+                        type=str)
+
+    parser.add_argument('-j',
+                        '--jsonl',
+                        help='Write compact JSON lines shards instead of '
+                        'one file per study',
+                        action='store_true')
+
+    parser.add_argument('-S',
+                        '--shard-size',
+                        help='Studies per shard with --jsonl',
+                        metavar='INT',
+                        type=int,
+                        default=10000)
+
+    parser.add_argument('-z',
+                        '--compress',
+                        help='Compress shards with --jsonl',
+                        metavar='STR',
+                        type=str,
+                        choices=list(COMPRESSION),
+                        default='none')
+
+    parser.add_argument('-m',
+                        '--manifest',
+                        help='SQLite manifest to skip unchanged documents',
+                        metavar='FILE',
+                        type=str)
+
+    parser.add_argument('-F',
+                        '--force',
+                        help='Convert every document even if unchanged',
+                        action='store_true')
+
+    parser.add_argument('-t',
+                        '--stream',
+                        help='Decode each document incrementally with '
+                        'iterparse',
+                        action='store_true')
+
+    parser.add_argument('-M',
+                        '--metrics',
+                        help='Write stage timings and latencies as JSON',
+                        metavar='FILE',
+                        type=str)
+
     args = parser.parse_args()
 
-    if not os.path.isdir(args.outdir):
-        os.makedirs(args.outdir)
+    if args.workers < 1:
+        parser.error(f'--workers "{args.workers}" must be greater than 0')
+
+    if args.shard_size < 1:
+        parser.error(f'--shard-size "{args.shard_size}" must be positive')
 
-    if args.dir and not args.file:
-        filenames = []
-        for dirname in args.dir:
-            if not os.path.isdir(dirname):
-                dirname = os.path.abspath(dirname)
-            filenames.extend(list(Path(dirname).rglob('*.xml')))
+    if args.compress != 'none' and not args.jsonl:
+        parser.error('--compress requires --jsonl')
 
-        args.file = filenames
+    if args.manifest and args.jsonl:
+        parser.error('--manifest cannot be used with --jsonl')
+
+    if not os.path.isdir(args.outdir):
+        os.makedirs(args.outdir)
 
-    if not args.file:
+    if not args.file and not args.dir:
         parser.error('Must indicate either input --file or --dir')
 
-    return Args(args.file, args.outdir, args.schema)
+    include = read_ids(args.contents) if args.contents else None
+    args.file = find_sources(args.file or args.dir, '.xml', include)
+
+    return Args(args.file, args.outdir, args.schema, args.workers,
+                args.jsonl, args.shard_size, args.compress, args.manifest,
+                args.force, args.stream, args.metrics)
 
 
 # --------------------------------------------------
@@ -277,103 +396,250 @@ def main() -> None:
     """ Make a jazz noise here """
 
     args = get_args()
-    schema = xmlschema.XMLSchema(args.schema.name)
     num_files = len(list(args.files))
 
-    print(f'Processing {num_files:,} file{"" if num_files == 1 else "s"}.')
-
-    num_written = 0
-    errors = []
-    for file in track(args.files, description="Processing..."):
-        # Determine outfile
-        basename = os.path.basename(file)
-        root = os.path.splitext(basename)[0]
-        out_file = os.path.join(args.outdir, root + '.json')
-        # print(file)
-
-        # Skip existing files
-        # if os.path.isfile(out_file):
-        #     continue
-
-        # Set the "text" to all the distinct words
-        # xml = xmltodict.parse(open(file).read())
-
-        xml = open(file).read()
-        if not schema.is_valid(xml):
-            errors.append(f'Invalid document "{file}"')
-            continue
-
-        data = schema.to_dict(xml)
-        tree = ElementTree().parse(file)
-        all_text = ' '.join(
-            set(chain.from_iterable((map(words, flatten(tree))))))
+    # The run's totals, kept apart from the (worker) METRICS they're
+    # taken from, even when converting in this process
+    totals = Metrics()
 
-        study = restructure(data, all_text)
-        # pprint(study)
+    print(f'Processing {num_files:,} file{"" if num_files == 1 else "s"}.')
 
-        # Convert to JSON
-        out_fh = open(out_file, 'wt')
-        out_fh.write(json.dumps(typedload.dump(study), indent=4) + '\n')
-        out_fh.close()
-        num_written += 1
+    convert = partial(convert_file, outdir=args.outdir)
+    shards = None
+    if args.jsonl:
+        convert = convert_line
+        shards = ShardWriter(args.outdir, args.shard_size, args.compress)
+
+    # With --force nothing is known, but new hashes are still recorded
+    manifest = Manifest(args.manifest) if args.manifest else None
+    known = None
+    if manifest:
+        known = {} if args.force else manifest.load()
+
+    if args.workers > 1:
+        with Pool(args.workers,
+                  initializer=init_worker,
+                  initargs=(args.schema.name, known, args.stream)) as pool:
+            num_written, num_skipped, errors = collect(
+                pool.imap(convert, args.files, chunksize=CHUNK_SIZE),
+                num_files, shards, manifest, totals)
+    else:
+        init_worker(args.schema.name, known, args.stream)
+        num_written, num_skipped, errors = collect(map(convert, args.files),
+                                                   num_files, shards,
+                                                   manifest, totals)
+
+    if manifest:
+        manifest.close()
 
     if errors:
         print('\n'.join([f'{len(errors)} ERRORS:'] + errors), file=sys.stderr)
 
+    if num_skipped:
+        print(f'Skipped {num_skipped:,} unchanged.')
+
+    print(totals.report())
+    if args.metrics:
+        totals.write(args.metrics)
+
     print(f'Done, wrote {num_written:,} to "{args.outdir}".')
 
 
 # --------------------------------------------------
-def words(t: Tuple[Any, str]) -> List[str]:
-    """ Return the words from the tuple value """
-    def clean(s):
-        s = re.sub('[\s_-]+', ' ', s)
-        return re.sub('[^a-zA-Z0-9.\s]', '', s)
+def collect(results: Iterator[Any], num_files: int,
+            shards: Optional[ShardWriter], manifest: Optional[Manifest],
+            metrics: Metrics) -> Tuple[int, int, List[str]]:
+    """
+    Count written and skipped files, gather errors and add up the
+    workers' metrics into metrics, in input order. With shards, results
+    are (JSON line, error, sample) to write here, otherwise Converted to
+    note in the manifest.
+    """
+
+    num_written = 0
+    num_skipped = 0
+    errors = []
+    pending: List[Tuple[str, str, str]] = []
+    for result in track(results, total=num_files,
+                        description="Processing..."):
+        if shards:
+            line, error, sample = result
+            metrics.add(sample)
+            if line:
+                with metrics.stage('write'):
+                    shards.write(line)
+        else:
+            error = result.error
+            metrics.add(result.sample)
+            if result.skipped:
+                num_skipped += 1
+                continue
+
+            if manifest and not error:
+                pending.append((result.name, result.digest, result.out_file))
+                if len(pending) == MANIFEST_BATCH:
+                    with metrics.stage('manifest'):
+                        manifest.update(pending)
+                    pending = []
+
+        if error:
+            errors.append(error)
+        else:
+            num_written += 1
+
+    if shards:
+        with metrics.stage('write'):
+            shards.close()
+
+    if manifest:
+        with metrics.stage('manifest'):
+            manifest.update(pending)
+
+    return num_written, num_skipped, errors
+
+
+# --------------------------------------------------
+def init_worker(filename: str,
+                known: Optional[Entries],
+                stream: bool = False) -> None:
+    """
+    Build the XML schema once per (worker) process and note the manifest
+    entries of documents that may be skipped and whether to stream
+    """
 
-    def stop(word):
-        # digit
-        if re.match('^[-]?[\d.]+$', word):
-            return False
+    global SCHEMA, KNOWN, STREAM, METRICS
+    SCHEMA = xmlschema.XMLSchema(filename)
+    KNOWN = known
+    STREAM = stream
+    METRICS = Metrics()
 
-        if len(word) <= 1:
-            return False
 
-        if word in ('an', 'the', 'and'):
-            return False
+# --------------------------------------------------
+def convert_file(file: Source, outdir: str) -> Converted:
+    """ Convert one XML file to JSON unless the manifest says it's done """
+
+    METRICS.mark()
+
+    # Determine outfile
+    basename = file.name
+    root = os.path.splitext(basename)[0]
+    out_file = os.path.abspath(os.path.join(outdir, root + '.json'))
+    # print(file)
+
+    # Skip files with the same content as when their output was written
+    raw = None
+    digest = ''
+    if KNOWN is not None:
+        with METRICS.stage('read'), file.open() as fh:
+            raw = fh.read()
+        with METRICS.stage('hash'):
+            digest = content_hash(raw)
+        if KNOWN.get(basename) == (digest, out_file) and os.path.isfile(
+                out_file):
+            METRICS.done()
+            return Converted(basename,
+                             out_file,
+                             digest,
+                             skipped=True,
+                             sample=METRICS.take())
+
+    study, error = read_study(file, raw)
+    if error:
+        METRICS.done()
+        return Converted(basename, out_file, digest, error, False,
+                         METRICS.take())
+
+    # Convert to JSON
+    with METRICS.stage('dump'):
+        out = dumps(study, indent=True) + b'\n'
+    with METRICS.stage('write'), open(out_file, 'wb') as out_fh:
+        out_fh.write(out)
+
+    METRICS.done()
+    return Converted(basename, out_file, digest, sample=METRICS.take())
+
+
+# --------------------------------------------------
+def convert_line(
+        file: Source) -> Tuple[Optional[bytes], Optional[str], Sample]:
+    """
+    Convert one XML file to a compact JSON line or an error message,
+    with the time it took
+    """
 
-        return True
+    METRICS.mark()
+    line = None
+    study, error = read_study(file)
+    if study:
+        with METRICS.stage('dump'):
+            line = dumps(study)
 
-    return list(filter(stop, map(clean, t[1].lower().split())))
+    METRICS.done()
+    return line, error, METRICS.take()
 
 
 # --------------------------------------------------
-def flatten(xml: str) -> List[Tuple[Any, Any]]:
-    """ Flatten XML"""
+def read_study(
+        file: Source,
+        raw: Optional[bytes] = None) -> Tuple[Optional[Study], Optional[str]]:
+    """
+    Parse, validate and restructure one XML file, or its bytes if already
+    read, or give an error
+    """
+
+    # Set the "text" to all the distinct words
+    # xml = xmltodict.parse(open(file).read())
+
+    try:
+        if STREAM:
+            with (file.open() if raw is None else io.BytesIO(raw)) as fh, \
+                    METRICS.stage('stream'):
+                data, words, errors = extract(fh, SCHEMA)
+        else:
+            if raw is None:
+                with METRICS.stage('read'), file.open() as fh:
+                    raw = fh.read()
+
+            # Parse once, then validate and decode the same tree
+            with METRICS.stage('parse'):
+                tree = ElementTree().parse(io.BytesIO(raw))
+            with METRICS.stage('validate/to_dict'):
+                data, errors = SCHEMA.to_dict(tree, validation='lax')
+            with METRICS.stage('words'):
+                words = set(tokenize(text for _, text in flatten(tree)))
+    except ParseError:
+        return None, f'Invalid document "{file}"'
 
-    # https://stackoverflow.com/questions/2170610/
-    # access-elementtree-node-parent-node
-    parent_map = {c: p for p in xml.iter() for c in p}
+    if errors:
+        return None, f'Invalid document "{file}"'
+
+    all_text = ' '.join(words)
+
+    with METRICS.stage('restructure'):
+        study = restructure(data, all_text)
+    # pprint(study)
 
-    def find_parents(child, parents=[]):
-        if parent := parent_map.get(child):
-            parents.append(parent.tag)
-            find_parents(parent, parents)
+    return study, None
 
-        return parents
 
-    rec = []
-    for child, parent in parent_map.items():
-        path = '.'.join(list(reversed(find_parents(child, []))) + [child.tag])
+# --------------------------------------------------
+def flatten(xml: Element) -> Iterator[Tuple[str, str]]:
+    """ Flatten XML to (dotted path, text) for every element below the root """
+
+    # Depth-first walk carrying each element's parent path on the stack
+    stack = [(child, xml.tag) for child in reversed(xml)]
+    while stack:
+        child, parent_path = stack.pop()
+        path = f'{parent_path}.{child.tag}'
 
         if text := child.text:
             if text := text.strip():
-                rec.append((path, text))
+                yield path, text
 
-        if attrib := child.attrib:
-            for key, val in attrib.items():
-                rec.append(('.'.join([path, key]), val))
+        for key, val in child.attrib.items():
+            yield f'{path}.{key}', val
 
-    return rec
+        stack.extend((grandchild, path) for grandchild in reversed(child))
 
 
 # --------------------------------------------------
@@ -424,9 +690,8 @@ def get_date(val: Any) -> str:
     """ Get date """
 
     if isinstance(val, dict) and '$' in val:
-        if dp := dateparser.parse(val['$']):
-            date = dt.datetime.utcfromtimestamp(dp.timestamp())
-            return date.strftime("%Y-%m-%d")
+        if date := parse_date(val['$']):
+            return date.isoformat()
 
     return ''
 
@@ -526,6 +791,48 @@ def get_contact(xml: Dict[str, Any], fld: str) -> Optional[Contact]:
                        email=val.get('email', ''))
 
 
+# --------------------------------------------------
+def get_name(val: Dict[str, Any]) -> str:
+    """ Full name of a contact or investigator """
+
+    return ' '.join(
+        filter(None, [val.get(fld, '')
+                      for fld in ['first_name', 'middle_name', 'last_name']]))
+
+
+# --------------------------------------------------
+def get_locations(xml: Dict[str, Any], fld: str) -> List[Location]:
+    """ Get locations """
+
+    locs = []
+    if fld in xml:
+        for val in xml[fld]:
+            investigators = map(get_name, val.get('investigator') or [])
+            locs.append(
+                Location(
+                    facility_name=(val.get('facility') or {}).get('name', ''),
+                    status=val.get('status', ''),
+                    contact_name=get_name(val.get('contact') or {}),
+                    investigator_name=', '.join(filter(None,
+                                                       investigators))))
+
+    return locs
+
+
+# --------------------------------------------------
+def get_links(xml: Dict[str, Any], fld: str) -> List[Link]:
+    """ Get links """
+
+    links = []
+    if fld in xml:
+        for val in xml[fld]:
+            links.append(
+                Link(url=val.get('url', ''),
+                     description=val.get('description', '')))
+
+    return links
+
+
 # --------------------------------------------------
 def get_eligibility(xml, fld) -> Optional[Eligibility]:
     """ Get eligibility """
@@ -717,6 +1024,8 @@ def restructure(xml: str, all_text: str) -> Study:
         secondary_outcomes=get_protocols(xml, 'secondary_outcome'),
         other_outcomes=get_protocols(xml, 'other_outcome'),
         arm_groups=get_arm_groups(xml, 'arm_group'),
+        locations=get_locations(xml, 'location'),
+        links=get_links(xml, 'link'),
         interventions=get_interventions(xml, 'intervention'),
         overall_official=get_investigators(xml, 'investigator'),
         overall_contact=get_contact(xml, 'overall_contact'),
@@ -0,0 +1,17 @@
+--
+-- Child rows are now synced per study by fetching them all by study_id
+-- and diffing in the loader, so the wide outcome index is no longer
+-- used for lookups. Index the study_id of outcomes and docs instead.
+--
+
+BEGIN;
+
+DROP INDEX IF EXISTS public.idx_study_outcome_1;
+
+CREATE INDEX IF NOT EXISTS idx_study_outcome_2
+    ON public.study_outcome USING btree (study_id);
+
+CREATE INDEX IF NOT EXISTS idx_study_doc_1
+    ON public.study_doc USING btree (study_id);
+
+COMMIT;
@@ -0,0 +1,21 @@
+--
+-- Arm groups, designs, eligibility, locations and URLs are now loaded by
+-- replacing a study's rows, deleting them by study_id. Index the study_id
+-- of each, and drop the wide arm group index: its descriptions can be
+-- longer than a btree entry allows.
+--
+
+BEGIN;
+
+DROP INDEX IF EXISTS public.idx_study_arm_group_1;
+
+CREATE INDEX IF NOT EXISTS idx_study_arm_group_2
+    ON public.study_arm_group USING btree (study_id);
+
+CREATE INDEX IF NOT EXISTS idx_study_design_1
+    ON public.study_design USING btree (study_id);
+
+CREATE INDEX IF NOT EXISTS idx_study_url_1
+    ON public.study_url USING btree (study_id);
+
+COMMIT;
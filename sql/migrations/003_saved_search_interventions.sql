@@ -0,0 +1,15 @@
+--
+-- Saved searches can filter on interventions, as SavedSearch in ct.py
+-- and search.py expect. Add the columns to databases built before
+-- pg_schema.sql had them.
+--
+
+BEGIN;
+
+ALTER TABLE public.saved_search
+    ADD COLUMN IF NOT EXISTS interventions text DEFAULT ''::text NOT NULL;
+
+ALTER TABLE public.saved_search
+    ADD COLUMN IF NOT EXISTS interventions_bool integer DEFAULT 0 NOT NULL;
+
+COMMIT;
@@ -0,0 +1,11 @@
+--
+-- Record when each data load started, by the database's clock, so alerts
+-- can find every study it changed even if the load ran past midnight.
+--
+
+BEGIN;
+
+ALTER TABLE public.dataload
+    ADD COLUMN IF NOT EXISTS started_at timestamp without time zone;
+
+COMMIT;
@@ -60,7 +60,8 @@ ALTER SEQUENCE public.condition_condition_id_seq OWNED BY public.condition.condi
 
 CREATE TABLE public.dataload (
     dataload_id integer NOT NULL,
-    updated_on date
+    updated_on date,
+    started_at timestamp without time zone
 );
 
 
@@ -170,6 +171,8 @@ CREATE TABLE public.saved_search (
     conditions_bool integer DEFAULT 0 NOT NULL,
     sponsors text DEFAULT ''::text NOT NULL,
     sponsors_bool integer DEFAULT 0 NOT NULL,
+    interventions text DEFAULT ''::text NOT NULL,
+    interventions_bool integer DEFAULT 0 NOT NULL,
     phase_ids text DEFAULT ''::text NOT NULL,
     study_type_ids text DEFAULT ''::text NOT NULL,
     enrollment integer DEFAULT 0 NOT NULL,
@@ -1162,10 +1165,24 @@ CREATE INDEX fulltext ON public.study USING gin (fulltext);
 
 
 --
--- Name: idx_study_arm_group_1; Type: INDEX; Schema: public; Owner: kyclark
+-- Name: idx_study_arm_group_2; Type: INDEX; Schema: public; Owner: kyclark
 --
 
-CREATE INDEX idx_study_arm_group_1 ON public.study_arm_group USING btree (study_id, arm_group_label, arm_group_type, description);
+CREATE INDEX idx_study_arm_group_2 ON public.study_arm_group USING btree (study_id);
+
+
+--
+-- Name: idx_study_design_1; Type: INDEX; Schema: public; Owner: kyclark
+--
+
+CREATE INDEX idx_study_design_1 ON public.study_design USING btree (study_id);
+
+
+--
+-- Name: idx_study_doc_1; Type: INDEX; Schema: public; Owner: kyclark
+--
+
+CREATE INDEX idx_study_doc_1 ON public.study_doc USING btree (study_id);
 
 
 --
@@ -1183,10 +1200,10 @@ CREATE INDEX idx_study_location_1 ON public.study_location USING btree (study_id
 
 
 --
--- Name: idx_study_outcome_1; Type: INDEX; Schema: public; Owner: kyclark
+-- Name: idx_study_outcome_2; Type: INDEX; Schema: public; Owner: kyclark
 --
 
-CREATE INDEX idx_study_outcome_1 ON public.study_outcome USING btree (study_id, outcome_type, measure, time_frame, description);
+CREATE INDEX idx_study_outcome_2 ON public.study_outcome USING btree (study_id);
 
 
 --
@@ -1210,6 +1227,13 @@ CREATE INDEX idx_study_to_intervention_1 ON public.study_to_intervention USING b
 CREATE INDEX idx_study_to_sponsor_1 ON public.study_to_sponsor USING btree (study_id, sponsor_id);
 
 
+--
+-- Name: idx_study_url_1; Type: INDEX; Schema: public; Owner: kyclark
+--
+
+CREATE INDEX idx_study_url_1 ON public.study_url USING btree (study_id);
+
+
 --
 -- Name: last_known_status_id; Type: INDEX; Schema: public; Owner: kyclark
 --